@@ -0,0 +1,235 @@
+"""
+Cross-document encounter aggregation.
+
+The pages of all loaded documents are grouped into encounters by patient
+and date of service. Each page takes the labelled patient and date it
+contains, or inherits them from the previous page of the same document.
+Faxed records repeat pages (cover sheets, the same note sent twice,
+re-faxed lab panels), so near-duplicate pages are found with MinHash
+signatures of word shingles and locality-sensitive hashing. Only the first
+copy of a page is kept. Pages are only compared within one patient and
+date, so templated notes of different visits are never merged.
+
+Each encounter's unique text is summarized on its own, with map-reduce for
+long encounters (see summarization.py). The encounter summaries are then
+laid out as one timeline ordered by date.
+"""
+import re
+import struct
+import asyncio
+import hashlib
+import functools
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from cache import get_summary_cache
+from fields import find_date, find_patient
+from summarization import ChunkedSummarizer
+from tokens import compact_text
+
+SHINGLE_WORDS = 5           # words per shingle
+NUM_PERM = 64               # MinHash signature length
+LSH_BANDS = 16              # NUM_PERM / LSH_BANDS rows per band; candidates from about 0.5 similarity
+DUPLICATE_SIMILARITY = 0.8  # estimated Jaccard similarity above which a page is a duplicate
+
+UNKNOWN_PATIENT = "Unknown patient"
+UNDATED = "Undated"
+
+_WORD = re.compile(r"\w+")
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%b %d %Y", "%B %d %Y")
+
+
+def normalize_date(value):
+    """ISO date (YYYY-MM-DD) for a date as written in a record, or None"""
+    if not value:
+        return None
+    text = " ".join(value.replace(",", " ").replace(".", " ").split())
+    for pattern in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, pattern).date().isoformat()
+        except ValueError:
+            continue
+    # Abbreviations strptime does not know ("Sept")
+    month, _, rest = text.partition(" ")
+    try:
+        return datetime.strptime(f"{month[:3]} {rest}", "%b %d %Y").date().isoformat()
+    except ValueError:
+        return None
+
+
+def patient_key(name):
+    """Grouping key of a patient name; "Doe, John Q." and "John Doe" share one"""
+    words = [word for word in _WORD.findall((name or "").lower()) if len(word) > 1]
+    return " ".join(sorted(words))
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Set of size-word shingles of text (case and punctuation ignored)"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set):
+    """MinHash signature of a shingle set, or None if it is empty
+
+    Every shingle is hashed once with SHAKE-128, whose output is read as
+    NUM_PERM independent 32-bit hash values.
+    """
+    if not shingle_set:
+        return None
+    rows = [_SIGNATURE.unpack(hashlib.shake_128(shingle.encode()).digest(_SIGNATURE.size))
+            for shingle in shingle_set]
+    return tuple(map(min, zip(*rows)))
+
+
+def similarity(a, b):
+    """Jaccard similarity estimated from two MinHash signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class DuplicateIndex:
+    """LSH index of MinHash signatures that finds the first near-duplicate of a page"""
+    def __init__(self, bands=LSH_BANDS, threshold=DUPLICATE_SIMILARITY):
+        self.rows = NUM_PERM // bands
+        self.threshold = threshold
+        self._buckets = [{} for _ in range(bands)]  # band -> {band values: [keys]}
+        self._signatures = {}
+
+    def _bands(self, signature):
+        for band, bucket in enumerate(self._buckets):
+            yield bucket, signature[band * self.rows:(band + 1) * self.rows]
+
+    def find(self, signature):
+        """Key of the most similar indexed page above the threshold, or None"""
+        candidates = set()
+        for bucket, values in self._bands(signature):
+            candidates.update(bucket.get(values, ()))
+        best, best_score = None, self.threshold
+        for key in candidates:
+            score = similarity(signature, self._signatures[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+    def add(self, key, signature):
+        self._signatures[key] = signature
+        for bucket, values in self._bands(signature):
+            bucket.setdefault(values, []).append(key)
+
+
+@dataclass
+class Encounter:
+    """Unique pages of one patient on one date of service, across documents"""
+    patient: str
+    date: Optional[str]  # ISO date, or None if no page carries one
+    pages: List[Tuple[object, int]] = field(default_factory=list)  # (MedicalDocument, page)
+    summary: str = ""
+
+    @property
+    def label(self):
+        return f"{self.date or UNDATED} - {self.patient}"
+
+    def sources(self):
+        """"file p.1-3, other.pdf p.7" for the pages of the encounter"""
+        ranges = []  # [document, first page, last page]
+        for document, number in self.pages:
+            if ranges and ranges[-1][0] is document and ranges[-1][2] == number - 1:
+                ranges[-1][2] = number
+            else:
+                ranges.append([document, number, number])
+        return ", ".join(
+            f"{document.filename} p.{first + 1}" + (f"-{last + 1}" if last > first else "")
+            for document, first, last in ranges)
+
+    def text(self):
+        """Compacted text of the encounter's pages"""
+        return compact_text(document.page_text(number) for document, number in self.pages)
+
+
+@dataclass
+class Aggregation:
+    """Encounters in timeline order and the duplicate pages left out of them"""
+    encounters: List[Encounter]
+    duplicates: List[Tuple[object, int, object, int]]  # (document, page, original document, page)
+    page_count: int
+
+    def describe(self):
+        return (f"{len(self.encounters)} encounter(s) from {self.page_count} page(s); "
+                f"{len(self.duplicates)} duplicate page(s) skipped")
+
+
+def group_encounters(documents):
+    """Group the pages of documents into encounters, dropping near-duplicate pages"""
+    encounters = {}  # (patient key, date) -> Encounter
+    indexes = {}     # (patient key, date) -> DuplicateIndex of its pages
+    names = {}       # patient key -> name as first written
+    duplicates = []
+    page_count = 0
+    for document in documents:
+        patient = date_of_service = None
+        for number in range(document.page_count):
+            text = document.page_text(number)
+            if not text.strip():
+                continue
+            page_count += 1
+            patient = find_patient(text) or patient
+            date_of_service = normalize_date(find_date(text)) or date_of_service
+
+            key = (patient_key(patient), date_of_service)
+            index = indexes.setdefault(key, DuplicateIndex())
+            signature = minhash(shingles(text))
+            if signature is not None:  # pages of punctuation only are never duplicates
+                original = index.find(signature)
+                if original is not None:
+                    duplicates.append((document, number) + original)
+                    continue
+                index.add((document, number), signature)
+
+            encounter = encounters.get(key)
+            if encounter is None:
+                name = names.setdefault(key[0], patient or UNKNOWN_PATIENT)
+                encounter = encounters[key] = Encounter(name, date_of_service)
+            encounter.pages.append((document, number))
+
+    # Undated encounters go last; patients stay together within a date
+    ordered = sorted(encounters.values(),
+                     key=lambda e: (e.date is None, e.date or "", e.patient.lower()))
+    return Aggregation(ordered, duplicates, page_count)
+
+
+async def summarize_encounters(aggregation, client, usage=None, concurrency=4, on_summary=None):
+    """Summarize every encounter with an AsyncLLMClient; on_summary(encounter) reports each
+
+    Identical encounter text is answered from the summary memo, so
+    rebuilding a timeline only sends the encounters that changed.
+    """
+    loop = asyncio.get_running_loop()
+    complete = client.complete if usage is None else functools.partial(client.complete, usage=usage)
+    summarizer = ChunkedSummarizer(complete, model=client.model, memo=get_summary_cache())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(encounter):
+        # Page extraction blocks, so it runs off the event loop
+        text = await loop.run_in_executor(None, encounter.text)
+        if text.strip():
+            async with semaphore:
+                encounter.summary, _ = await summarizer.summarize_memoized_async(text)
+        if on_summary is not None:
+            on_summary(encounter)
+
+    await asyncio.gather(*(summarize(encounter) for encounter in aggregation.encounters))
+    return aggregation
+
+
+def format_timeline(aggregation):
+    """Encounter timeline as plain text for the Encounter Builder"""
+    parts = [f"Encounter timeline ({aggregation.describe()})"]
+    for encounter in aggregation.encounters:
+        parts.append(f"== {encounter.label} ==\nSources: {encounter.sources()}")
+        if encounter.summary:
+            parts.append(encounter.summary)
+    return "\n\n".join(parts)
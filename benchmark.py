@@ -0,0 +1,392 @@
+"""
+Reproducible performance benchmarks.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --pages 10 100 1000 --output bench.json --baseline previous.json
+
+Synthetic medical PDFs of the requested page counts are generated with
+PyMuPDF (the same seed always gives the same files) and used to measure:
+
+- startup time until the main window is shown (in a fresh interpreter)
+- extraction throughput (layout and plain text, serial and parallel)
+- memory per MedicalDocument (retained while idle, peak while reading)
+- display_document latency in an offscreen main window
+- summarization throughput against mock_openai_server.py
+
+Every run uses a fresh cache directory, so nothing is served from an earlier
+run. Results are written as JSON; with --baseline, metrics that got worse by
+more than --tolerance are reported and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+
+import fitz  # PyMuPDF
+
+PROVIDERS = ["Dr. Jane Roe", "Dr. Ahmed Khan", "Dr. Maria Lopez", "Dr. Wei Chen"]
+COMPLAINTS = ["knee pain", "follow-up of hypertension", "shortness of breath",
+              "low back pain", "medication refill", "persistent cough"]
+ASSESSMENTS = ["hypertension, controlled", "lumbar strain", "acute bronchitis",
+               "type 2 diabetes mellitus", "osteoarthritis of the knee"]
+MEDICATIONS = ["lisinopril 10 mg daily", "metformin 500 mg twice daily",
+               "ibuprofen 400 mg as needed", "albuterol inhaler as needed",
+               "atorvastatin 20 mg nightly"]
+WORDS = ("patient reports symptoms improved since the last visit denies fever chills "
+         "nausea chest pain exam unremarkable vitals stable plan discussed questions "
+         "answered will continue current regimen and return if worse").split()
+
+# Run in a fresh interpreter by bench_startup; writes the timings as JSON to the
+# file named by its argument, since imports may print to stdout themselves
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+window = main.POWParserApp()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+heavy = [name for name in ("fitz", "aiohttp", "openai", "tiktoken") if name in sys.modules]
+with open(sys.argv[1], "w") as file:
+    json.dump({"import": imported - start, "shown": shown - start, "heavy": heavy}, file)
+window.close()
+"""
+STARTUP_TARGET = 0.5  # seconds from launch to a visible window
+
+# Metrics where a higher value is better; for all others lower is better
+HIGHER_IS_BETTER = ("pages_per_second", "chars_per_second", "documents_per_second",
+                    "requests_per_second")
+
+
+def make_medical_pdf(path, pages, seed=0):
+    """Write a synthetic medical record of pages pages to path"""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        page.insert_text((50, 30), "Mercy General Hospital - Confidential Medical Record", fontsize=8)
+        page.insert_text((480, 820), f"Page {number + 1} of {pages}", fontsize=8)
+        y = 70
+        lines = [
+            "Patient: John Doe    MRN: 00012345",
+            f"Date of Service: {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024",
+            f"Provider: {rng.choice(PROVIDERS)}",
+            f"Chief Complaint: {rng.choice(COMPLAINTS)}",
+            "",
+            "History of Present Illness:",
+        ]
+        for _ in range(12):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(14)))
+        lines += ["", f"Assessment: {rng.choice(ASSESSMENTS)}",
+                  f"Plan: {' '.join(rng.choice(WORDS) for _ in range(10))}", "", "Medications:"]
+        lines += [f"- {med}" for med in rng.sample(MEDICATIONS, 3)]
+        for line in lines:
+            page.insert_text((50, y), line, fontsize=9)
+            y += 13
+        # A small lab table in aligned columns
+        y += 10
+        for test, low, high in (("Glucose", 70, 99), ("Sodium", 135, 145), ("Potassium", 3.5, 5.1)):
+            value = round(rng.uniform(low * 0.9, high * 1.1), 1)
+            for x, cell in ((50, test), (200, str(value)), (350, f"{low}-{high}")):
+                page.insert_text((x, y), cell, fontsize=9)
+            y += 13
+    pdf.save(path)
+    pdf.close()
+
+
+def timed(function, *args, **kwargs):
+    """(result, seconds) of one call"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_startup(repeats=5):
+    """Seconds to import main and to show the window, and process wall time (medians)"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, "startup.json")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, result_path], cwd=here,
+                           env=env, capture_output=True, check=True)
+            wall = time.perf_counter() - start
+            with open(result_path) as file:
+                timings = json.load(file)
+            runs.append((timings["import"], timings["shown"], wall, timings["heavy"]))
+
+    def median(index):
+        return round(sorted(run[index] for run in runs)[len(runs) // 2], 4)
+
+    shown = median(1)
+    if shown > STARTUP_TARGET:
+        print(f"Startup: window shown after {shown:.2f}s (target {STARTUP_TARGET}s)",
+              file=sys.stderr)
+    return {
+        "import_seconds": median(0),
+        "window_shown_seconds": shown,
+        "process_seconds": median(2),
+        "heavy_modules_at_startup": runs[-1][3],
+    }
+
+
+def bench_extraction(paths, workers, repeats=3):
+    """Pages and characters per second for each extraction mode (best of repeats)"""
+    from extraction import extract_pdf
+    results = {}
+    for pages, path in paths.items():
+        modes = {
+            "plain": dict(layout=False, workers=1),
+            "layout": dict(layout=True, workers=1),
+            "layout_parallel": dict(layout=True, workers=workers),
+        }
+        for mode, options in modes.items():
+            runs = [timed(extract_pdf, path, **options) for _ in range(repeats)]
+            result, seconds = min(runs, key=lambda run: run[1])
+            results[f"{mode}/{pages}"] = {
+                "seconds": round(seconds, 4),
+                "pages_per_second": round(result.page_count / seconds, 1),
+                "chars_per_second": round(result.char_count / seconds, 1),
+                "chars": result.char_count,
+            }
+    return results
+
+
+def bench_memory(paths, documents):
+    """Bytes retained per idle MedicalDocument and peak bytes while reading one"""
+    from document import MedicalDocument, page_cache
+    results = {}
+    for pages, path in paths.items():
+        content_hash = MedicalDocument(path).content_hash
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        docs = [MedicalDocument(path, pages, content_hash) for _ in range(documents)]
+        retained = (tracemalloc.get_traced_memory()[0] - before) / documents
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        docs[0].read_text()
+        peak = tracemalloc.get_traced_memory()[1] - start
+        tracemalloc.stop()
+        docs[0].close()
+        page_cache.discard(content_hash)
+        results[str(pages)] = {"retained_bytes": round(retained), "peak_read_bytes": peak}
+    return results
+
+
+def bench_display(paths, repeats=5):
+    """display_document latency for a first view and for views from the page cache"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from main import POWParserApp
+    from document import MedicalDocument
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = POWParserApp()
+    window.show()
+    results = {}
+    try:
+        for pages, path in paths.items():
+            doc = MedicalDocument(path, pages)
+            item = window.insert_document(doc)
+
+            _, cold = timed(lambda: (window.display_document(item), app.processEvents()))
+            warm = []
+            for _ in range(repeats):
+                _, seconds = timed(lambda: (window.display_document(item), app.processEvents()))
+                warm.append(seconds)
+            jump = []
+            for target in (pages // 2, pages - 1, 0):
+                _, seconds = timed(lambda: (window.doc_preview.go_to_page(target),
+                                            app.processEvents()))
+                jump.append(seconds)
+            results[str(pages)] = {
+                "first_seconds": round(cold, 4),
+                "cached_seconds": round(sorted(warm)[len(warm) // 2], 4),
+                "jump_seconds": round(max(jump), 4),
+            }
+    finally:
+        window.close()
+    return results
+
+
+def bench_summarization(directory, pages, documents, concurrency, latency):
+    """Documents and requests per second against the mock API"""
+    from mock_openai_server import start_in_thread
+    from document import MedicalDocument
+    from llm_client import AsyncLLMClient, TokenUsage
+    from summarization import summarize_document
+
+    server, api_base = start_in_thread(latency=latency)
+    # Distinct records so neither the summary store nor the memo answers for them
+    paths = []
+    for i in range(documents):
+        copy = os.path.join(directory, f"summary_{i}.pdf")
+        make_medical_pdf(copy, pages, seed=1000 + i)
+        paths.append(copy)
+    docs = [MedicalDocument(p) for p in paths]
+    for doc in docs:
+        doc.read_text()  # extraction is measured separately
+
+    async def run():
+        client = AsyncLLMClient("benchmark", api_base=api_base, max_connections=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        usage = TokenUsage()
+
+        async def summarize(doc):
+            async with semaphore:
+                await summarize_document(doc, client, usage=usage)
+
+        try:
+            await asyncio.gather(*(summarize(doc) for doc in docs))
+        finally:
+            await client.close()
+        return client.metrics.snapshot(), usage
+
+    start = time.perf_counter()
+    stats, usage = asyncio.run(run())
+    seconds = time.perf_counter() - start
+    server.shutdown()
+    return {
+        "documents": documents,
+        "pages_per_document": pages,
+        "concurrency": concurrency,
+        "mock_latency": latency,
+        "seconds": round(seconds, 4),
+        "documents_per_second": round(documents / seconds, 2),
+        "requests_per_second": round(stats["requests"] / seconds, 2),
+        "request_p50_seconds": round(stats["p50"], 4),
+        "request_p95_seconds": round(stats["p95"], 4),
+        "prompt_tokens": usage.prompt,
+    }
+
+
+def flatten(results, prefix=""):
+    """{"a/b/c": number} for every numeric leaf"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "/"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Descriptions of the metrics that regressed by more than tolerance"""
+    current = flatten(results)
+    regressions = []
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        metric = name.rsplit("/", 1)[-1]
+        if new is None or not old or not (metric.endswith("seconds") or metric.endswith("bytes")
+                                           or metric in HIGHER_IS_BETTER):
+            continue
+        change = (new - old) / old
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="P.O.W. Parser performance benchmarks")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500],
+                        help="page counts of the generated PDFs")
+    parser.add_argument("--documents", type=int, default=20,
+                        help="documents for the memory and summarization benchmarks")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for parallel extraction")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="concurrent summaries against the mock API")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="mock API seconds per request")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per timing; the best (or median) is reported")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        choices=["startup", "extraction", "memory", "display",
+                                 "summarization"])
+    parser.add_argument("--output", "-o", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative regression before failing")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    work = tempfile.mkdtemp(prefix="pow-bench-")
+    # Fresh caches, so every run measures the same cold work
+    os.environ["POW_PARSER_CACHE_DIR"] = os.path.join(work, "cache")
+
+    paths = {}
+    for pages in args.pages:
+        path = os.path.join(work, f"record_{pages}.pdf")
+        make_medical_pdf(path, pages, seed=pages)
+        paths[pages] = path
+
+    results = {}
+    steps = [
+        ("startup", lambda: bench_startup(args.repeat)),
+        ("extraction", lambda: bench_extraction(paths, args.workers, args.repeat)),
+        ("memory", lambda: bench_memory(paths, args.documents)),
+        ("display", lambda: bench_display(paths, args.repeat)),
+        ("summarization", lambda: bench_summarization(
+            work, min(args.pages), args.documents, args.concurrency, args.latency)),
+    ]
+    try:
+        for name, step in steps:
+            if name in args.skip:
+                continue
+            print(f"Running {name} benchmark...", file=sys.stderr)
+            results[name] = step()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "cpus": os.cpu_count(),
+        },
+        "config": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against the baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
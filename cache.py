@@ -0,0 +1,329 @@
+"""
+Persistent, content-addressed extraction cache.
+
+Documents are identified by the SHA-256 of their file contents, so a PDF that
+has been seen before (in any session, under any name) is reopened without
+running PyMuPDF again. Page text, page counts and summaries live in a SQLite
+database under ~/.pow_parser (or $POW_PARSER_CACHE_DIR). The whole cache is
+dropped when the PyMuPDF version changes, and the least recently used
+documents are evicted once the stored text exceeds the size budget.
+
+OCR text of scanned pages is stored by a hash of the page's images, so the
+same scan is only OCR'd once, even inside different PDFs. The same database
+also holds memoized LLM summaries keyed by a hash of the input text, prompt
+and model parameters (see SummaryCache).
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Bump when the stored format or extraction logic changes
+SCHEMA_VERSION = "3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    hash TEXT PRIMARY KEY,
+    page_count INTEGER NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    hash TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (hash, number)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    hash TEXT PRIMARY KEY,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ocr (
+    hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memo (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+
+def default_cache_dir():
+    """Directory holding the on-disk caches"""
+    return os.environ.get("POW_PARSER_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".pow_parser")
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """SQLite store of page text, page counts and summaries keyed by content hash"""
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._check_version()
+
+    def _check_version(self):
+        """Invalidate everything if PyMuPDF or the schema changed"""
+        import fitz  # PyMuPDF
+        version = f"{SCHEMA_VERSION}/{fitz.VersionBind}"
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and row[0] == version:
+                return
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.execute("DELETE FROM ocr")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+    def get_page_count(self, content_hash):
+        """Page count of a known document, or None"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT page_count FROM documents WHERE hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE documents SET last_used = ? WHERE hash = ?", (time.time(), content_hash))
+            return row[0]
+
+    def put_document(self, content_hash, page_count):
+        """Record a document and its page count"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (hash, page_count, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET page_count = excluded.page_count, "
+                "last_used = excluded.last_used",
+                (content_hash, page_count, time.time()))
+
+    def get_page(self, content_hash, number):
+        """Cached text of one page, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE hash = ? AND number = ?",
+                (content_hash, number)).fetchone()
+        return row[0] if row else None
+
+    def get_pages(self, content_hash):
+        """All page texts of a document if every page is cached, else None"""
+        page_count = self.get_page_count(content_hash)
+        if page_count is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM pages WHERE hash = ? ORDER BY number",
+                (content_hash,)).fetchall()
+        if len(rows) != page_count:
+            return None
+        return [row[0] for row in rows]
+
+    def cached_pages(self, content_hash):
+        """Number of pages of a document that are cached"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE hash = ?", (content_hash,)).fetchone()[0]
+
+    def put_pages(self, content_hash, page_count, pages, start=0):
+        """Store page texts of a document starting at page number start"""
+        size = sum(len(text.encode("utf-8")) for text in pages)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO documents (hash, page_count, last_used) VALUES (?, ?, ?)",
+                (content_hash, page_count, time.time()))
+            # Pages being replaced no longer count towards the document size
+            replaced = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM pages "
+                "WHERE hash = ? AND number >= ? AND number < ?",
+                (content_hash, start, start + len(pages))).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (hash, number, text) VALUES (?, ?, ?)",
+                [(content_hash, start + i, text) for i, text in enumerate(pages)])
+            self._conn.execute(
+                "UPDATE documents SET size = size + ?, last_used = ? WHERE hash = ?",
+                (size - replaced, time.time(), content_hash))
+        self.evict()
+
+    def put_text_pages(self, content_hash, page_count, pages):
+        """Store the pages of a document that have text
+
+        Blank pages may be scans, so they are left out for page_text to
+        send to OCR instead of being cached as empty.
+        """
+        start = 0
+        for number, text in enumerate(list(pages) + [""]):
+            if not text.strip():
+                if number > start:
+                    self.put_pages(content_hash, page_count, pages[start:number], start)
+                start = number + 1
+
+    def get_summary(self, content_hash):
+        """Stored summary of a document, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, content_hash, summary):
+        """Store the summary of a document"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (hash, summary) VALUES (?, ?)",
+                (content_hash, summary))
+
+    def get_ocr(self, image_hash):
+        """OCR text of a page image, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr WHERE hash = ?", (image_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_ocr(self, image_hash, text):
+        """Store the OCR text of a page image"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr (hash, text) VALUES (?, ?)", (image_hash, text))
+
+    def get_memo(self, key):
+        """Memoized summary for a summary key, or None"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT summary FROM memo WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE memo SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put_memo(self, key, summary, max_entries=10000):
+        """Memoize a summary, keeping at most max_entries of the most recent"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memo (key, summary, last_used) VALUES (?, ?, ?)",
+                (key, summary, time.time()))
+            self._conn.execute(
+                "DELETE FROM memo WHERE key NOT IN "
+                "(SELECT key FROM memo ORDER BY last_used DESC LIMIT ?)", (max_entries,))
+
+    def known_hashes(self):
+        """Content hashes of every document in the cache"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT hash FROM documents")}
+
+    def total_size(self):
+        """Bytes of page text currently stored"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used documents until the cache fits its budget"""
+        with self._lock, self._conn:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute(
+                "SELECT hash, size FROM documents ORDER BY last_used").fetchall()
+            for content_hash, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM pages WHERE hash = ?", (content_hash,))
+                self._conn.execute("DELETE FROM summaries WHERE hash = ?", (content_hash,))
+                self._conn.execute("DELETE FROM documents WHERE hash = ?", (content_hash,))
+                total -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def summary_key(text, **params):
+    """Hash identifying a summary of text produced with the given prompt and model parameters"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """Memoized summaries: an in-memory LRU in front of the persistent extraction cache"""
+    def __init__(self, store=None, max_entries=256):
+        self.store = store
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # summary key -> summary
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Summary for key, or None"""
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is not None:
+                self._entries.move_to_end(key)
+                return summary
+        summary = self.store.get_memo(key) if self.store else None
+        if summary is not None:
+            self._remember(key, summary)
+        return summary
+
+    def put(self, key, summary):
+        """Store a summary in both tiers"""
+        self._remember(key, summary)
+        if self.store:
+            self.store.put_memo(key, summary)
+
+    def _remember(self, key, summary):
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = None
+_summary_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Shared ExtractionCache for this process, or None if it cannot be opened"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ExtractionCache(os.path.join(default_cache_dir(), "extraction.sqlite3"))
+            except (OSError, sqlite3.Error) as e:
+                print(f"Extraction cache unavailable: {e}")
+                _cache = False
+        return _cache or None
+
+
+def get_summary_cache():
+    """Shared SummaryCache for this process"""
+    global _summary_cache
+    store = get_cache()
+    with _cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache(store)
+        return _summary_cache
@@ -0,0 +1,234 @@
+"""
+Lazy, page-on-demand medical documents.
+
+A MedicalDocument only records where its PDF lives. Page text is extracted
+the first time a page is viewed or summarized and kept in a process-wide
+LRU cache with a fixed byte budget, so memory stays bounded no matter how
+many documents are loaded. Extracted pages and summaries are also written
+to the persistent extraction cache, keyed by the file's content hash, so
+known documents reopen without running PyMuPDF again.
+
+Pages without a text layer that carry images are scanned pages. Their text
+comes from the OCR cache when the same images were OCR'd before; otherwise
+they read as empty and are handed to ocr_handler, which the GUI points at a
+background OCR queue that fills them in later.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from cache import file_hash, get_cache
+from extraction import PARALLEL_MIN_PAGES, extract_page, extract_parallel
+from fields import extract_fields
+from instrumentation import count, span
+from ocr import page_image_hash
+
+# PyMuPDF is not thread-safe, so every access to a fitz.Document goes
+# through this lock (the GUI and summarizer threads both read pages).
+_fitz_lock = threading.RLock()
+
+
+class PageCache:
+    """LRU cache of extracted page text bounded by total size in bytes"""
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._pages = OrderedDict()  # (content hash, page number) -> text
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return cached page text or None, marking the page recently used"""
+        with self._lock:
+            text = self._pages.get(key)
+            if text is not None:
+                self._pages.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        """Cache page text, evicting least recently used pages over budget"""
+        size = sys.getsizeof(text)
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self.current_bytes -= sys.getsizeof(old)
+            if size > self.max_bytes:
+                return
+            self._pages[key] = text
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self.current_bytes -= sys.getsizeof(evicted)
+
+    def discard(self, content_hash):
+        """Drop every cached page belonging to a document"""
+        with self._lock:
+            for key in [key for key in self._pages if key[0] == content_hash]:
+                self.current_bytes -= sys.getsizeof(self._pages.pop(key))
+
+
+class _OpenDocuments:
+    """Small LRU of open fitz handles so thousands of documents do not exhaust file descriptors"""
+    def __init__(self, max_open=32):
+        self.max_open = max_open
+        self._docs = OrderedDict()  # path -> fitz.Document
+
+    def get(self, path):
+        """Return an open handle for path (caller must hold _fitz_lock)"""
+        pdf = self._docs.get(path)
+        if pdf is None:
+            import fitz  # PyMuPDF; imported on first use to keep startup fast
+            with span("pdf.open"):
+                pdf = fitz.open(path)
+            self._docs[path] = pdf
+            while len(self._docs) > self.max_open:
+                _, evicted = self._docs.popitem(last=False)
+                evicted.close()
+        else:
+            self._docs.move_to_end(path)
+        return pdf
+
+    def close(self, path):
+        """Close the handle for path if it is open (caller must hold _fitz_lock)"""
+        pdf = self._docs.pop(path, None)
+        if pdf is not None:
+            pdf.close()
+
+
+page_cache = PageCache()
+_open_documents = _OpenDocuments()
+
+# Called as ocr_handler(document, page number, image hash) for scanned pages
+# without cached OCR text
+ocr_handler = None
+
+
+class MedicalDocument:
+    """Class representing a medical document"""
+    __slots__ = ("path", "filename", "content_hash", "summary", "fields", "page_source",
+                 "pending_ocr", "_page_count")
+
+    def __init__(self, path, page_count=None, content_hash=None):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.content_hash = content_hash or file_hash(path)
+        self._page_count = page_count
+        self.fields = None  # fields.EncounterRecord once extracted
+        # Optional page_source(number) -> text or None, e.g. a saved session;
+        # consulted after the extraction cache and before the PDF
+        self.page_source = None
+        self.pending_ocr = set()  # page numbers queued for OCR and not finished yet
+
+        cache = get_cache()
+        self.summary = (cache and cache.get_summary(self.content_hash)) or ""
+
+    @property
+    def page_count(self):
+        """Number of pages, opening the PDF if it is not known yet"""
+        if self._page_count is None:
+            cache = get_cache()
+            if cache:
+                self._page_count = cache.get_page_count(self.content_hash)
+        if self._page_count is None:
+            try:
+                with _fitz_lock:
+                    self._page_count = len(_open_documents.get(self.path))
+            except Exception as e:
+                print(f"Error opening {self.path}: {e}")
+                return 0
+            if cache:
+                cache.put_document(self.content_hash, self._page_count)
+        return self._page_count
+
+    def page_text(self, number):
+        """Text of a single page, extracted on first use"""
+        key = (self.content_hash, number)
+        text = page_cache.get(key)
+        if text is not None:
+            count("page.memory_hit")
+            return text
+
+        cache = get_cache()
+        if cache:
+            text = cache.get_page(self.content_hash, number)
+        if text is None and self.page_source is not None:
+            text = self.page_source(number)
+        # A blank stored page may be a scan saved before OCR, so it is checked again
+        if text is not None and text.strip():
+            count("page.disk_hit")
+        else:
+            try:
+                with _fitz_lock, span("page.extract", page=number):
+                    pdf = _open_documents.get(self.path)
+                    text = extract_page(pdf, number)
+                    image_hash = None if text.strip() else page_image_hash(pdf, number)
+                count("page.extracted")
+            except Exception as e:
+                print(f"Error extracting page {number + 1} of {self.path}: {e}")
+                return ""
+            if image_hash:
+                text = cache and cache.get_ocr(image_hash)
+                if not text:
+                    # Not stored on disk, so the page is OCR'd again next session
+                    page_cache.put(key, "")
+                    if ocr_handler is not None:
+                        self.pending_ocr.add(number)
+                        ocr_handler(self, number, image_hash)
+                    return page_cache.get(key) or ""
+            if cache:
+                cache.put_pages(self.content_hash, self.page_count, [text], start=number)
+        page_cache.put(key, text)
+        return text
+
+    def set_page_text(self, number, text):
+        """Replace the text of a page, e.g. with OCR results"""
+        page_cache.put((self.content_hash, number), text)
+        cache = get_cache()
+        if cache:
+            cache.put_pages(self.content_hash, self.page_count, [text], start=number)
+
+    def load_pages(self, workers=None):
+        """Extract every page into the extraction cache, in worker processes for large PDFs"""
+        cache = get_cache()
+        page_count = self.page_count
+        if (not cache or page_count < PARALLEL_MIN_PAGES or self.page_source is not None
+                or cache.cached_pages(self.content_hash) == page_count):
+            return
+        cache.put_text_pages(self.content_hash, page_count,
+                             extract_parallel(self.path, page_count, workers))
+
+    def read_text(self, max_chars=None):
+        """Document text, extracting only as many pages as max_chars needs"""
+        parts = []
+        length = 0
+        for number in range(self.page_count):
+            if max_chars is not None and length >= max_chars:
+                break
+            text = self.page_text(number)
+            parts.append(text)
+            length += len(text)
+        text = "".join(parts)
+        return text if max_chars is None else text[:max_chars]
+
+    @property
+    def text_content(self):
+        """Full document text (assembled on demand, not kept in memory)"""
+        return self.read_text()
+
+    def extract_fields(self):
+        """Fill self.fields from the document text with the local rules"""
+        self.fields = extract_fields(self.text_content)
+        return self.fields
+
+    def store_summary(self, summary):
+        """Set the summary and keep it in the extraction cache"""
+        self.summary = summary
+        cache = get_cache()
+        if cache:
+            cache.put_summary(self.content_hash, summary)
+
+    def close(self):
+        """Release the PDF handle and any in-memory cached pages"""
+        with _fitz_lock:
+            _open_documents.close(self.path)
+        page_cache.discard(self.content_hash)
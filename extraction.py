@@ -0,0 +1,364 @@
+"""
+Shared PDF text extraction.
+
+Every entry point (MedicalDocument, SimplePOWParser and quick_test) extracts
+text through this module. Pages are collected in a list and joined once, so
+assembly is linear in the document size, and the result keeps a page-offset
+index for mapping character positions back to pages.
+
+Pages are extracted in layout mode by default: text blocks are put back in
+reading order column by column, ruled or row-aligned tables are emitted one
+row per line with " | " between cells, whitespace is compacted, and header
+and footer lines that repeat across the document are dropped. The result is
+noticeably smaller than plain get_text() output, which saves both memory and
+LLM tokens. Large PDFs are split into page ranges extracted in parallel
+worker processes.
+"""
+import os
+import re
+import time
+import multiprocessing
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import record
+
+# PDFs with at least this many pages are extracted by several processes
+PARALLEL_MIN_PAGES = 64
+
+MARGIN = 0.1             # fraction of the page height searched for headers and footers
+MARGIN_SAMPLE_PAGES = 12  # pages sampled to find repeated header/footer lines
+ROW_TOLERANCE = 3.0      # points between baselines or block tops that still count as one row
+CELL_GAP = 12.0          # points of horizontal space that separate two table cells
+
+_SPACES = re.compile(r"[ \t\u00a0]+")
+# "Page 3", "page 3 of 10", "Page 3/10" anywhere in a line, and lines that are only a page number
+_PAGE_NUMBER = re.compile(r"\bpage\s*\d+(?:\s*(?:of|/)\s*\d+)?", re.IGNORECASE)
+_BARE_PAGE_NUMBER = re.compile(r"[-\u2013\s]*\d+(?:\s*(?:of|/)\s*\d+)?[-\u2013\s]*")
+# Lines that carry clinical data (dates, "Label: value" fields) are never dropped
+_DATE = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|"
+                   r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}\b",
+                   re.IGNORECASE)
+_LABELLED_FIELD = re.compile(r"^[^\W\d][\w .#/&()-]{0,40}:\s*\S")
+
+# (path, page count, mtime) -> set of normalized header/footer lines
+_margin_cache = OrderedDict()
+
+
+def _clean(text):
+    """Compact whitespace and drop blank lines"""
+    lines = (_SPACES.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _normalize(line):
+    """Header/footer key of a line, or None if the line must be kept
+
+    Only page numbers may vary between the copies of a repeated line; any
+    other difference (a date, an MRN, a name) makes the lines distinct.
+    """
+    line = _SPACES.sub(" ", line).strip().lower()
+    if not line or _DATE.search(line) or _LABELLED_FIELD.match(line):
+        return None
+    if _BARE_PAGE_NUMBER.fullmatch(line):
+        return "#"
+    return _PAGE_NUMBER.sub("page #", line)
+
+
+def _text_blocks(page, textpage=None):
+    """(x0, y0, x1, y1, text) of the text blocks of a page (or of an OCR textpage)
+
+    Lines of a block that sit on the same baseline (PyMuPDF merges the cells
+    of a table row into one block) are joined, with " | " across wide gaps.
+    """
+    import fitz  # PyMuPDF
+    flags = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+    blocks = []
+    for block in page.get_text("dict", flags=flags, textpage=textpage)["blocks"]:
+        rows = []  # (baseline, [(x0, x1, text)])
+        for line in block.get("lines", ()):
+            text = "".join(span["text"] for span in line["spans"])
+            if not text.strip():
+                continue
+            x0, _, x1, _ = line["bbox"]
+            baseline = line["spans"][0]["origin"][1]
+            if rows and abs(baseline - rows[-1][0]) <= ROW_TOLERANCE:
+                rows[-1][1].append((x0, x1, text))
+            else:
+                rows.append((baseline, [(x0, x1, text)]))
+        lines = []
+        for _, cells in rows:
+            cells.sort()
+            parts = [cells[0][2]]
+            for previous, cell in zip(cells, cells[1:]):
+                parts.append(" | " if cell[0] - previous[1] > CELL_GAP else " ")
+                parts.append(cell[2])
+            lines.append("".join(parts))
+        text = _clean("\n".join(lines))
+        if text:
+            blocks.append(tuple(block["bbox"]) + (text,))
+    return blocks
+
+
+def _margin_lines(page):
+    """Lines of the text blocks in the top and bottom margins of a page"""
+    height = page.rect.height
+    lines = set()
+    for x0, y0, x1, y1, text in _text_blocks(page):
+        if y1 <= height * MARGIN or y0 >= height * (1 - MARGIN):
+            lines.update(_normalize(line) for line in text.splitlines())
+    lines.discard(None)
+    return lines
+
+
+def repeated_margin_lines(pdf):
+    """Normalized header/footer lines that repeat on most sampled pages"""
+    total = len(pdf)
+    if total < 3:
+        return set()
+    try:
+        key = (pdf.name, total, os.path.getmtime(pdf.name))
+    except OSError:
+        key = None
+    if key in _margin_cache:
+        _margin_cache.move_to_end(key)
+        return _margin_cache[key]
+
+    step = max(1, total // MARGIN_SAMPLE_PAGES)
+    sample = range(0, total, step)[:MARGIN_SAMPLE_PAGES]
+    counts = Counter()
+    for number in sample:
+        counts.update(_margin_lines(pdf[number]))
+    threshold = max(2, (len(sample) + 1) // 2)
+    repeated = {line for line, count in counts.items() if count >= threshold}
+
+    if key is not None:
+        _margin_cache[key] = repeated
+        while len(_margin_cache) > 64:
+            _margin_cache.popitem(last=False)
+    return repeated
+
+
+def _find_tables(page, blocks):
+    """Rows of the ruled tables on a page and the blocks they cover
+
+    Needs PyMuPDF 1.23+ (page.find_tables); older versions and pages without
+    enough vector lines to form a grid fall back to row alignment.
+    """
+    if not hasattr(page, "find_tables") or len(page.get_drawings()) < 4:
+        return [], set()
+    import fitz  # PyMuPDF
+    rows = []
+    covered = set()
+    for table in page.find_tables().tables:
+        bbox = fitz.Rect(table.bbox)
+        lines = [" | ".join(_clean(cell or "").replace("\n", " ") for cell in row)
+                 for row in table.extract()]
+        rows.append((bbox.y0, bbox.x0, "\n".join(lines)))
+        covered.update(i for i, block in enumerate(blocks)
+                       if bbox.contains(fitz.Rect(block[:4])))
+    return rows, covered
+
+
+def _columns(blocks):
+    """Split blocks into columns at vertical gutters no block crosses"""
+    blocks = sorted(blocks, key=lambda b: b[0])
+    columns = []
+    right = None
+    for block in blocks:
+        if right is None or block[0] >= right:
+            columns.append([])
+            right = block[2]
+        columns[-1].append(block)
+        right = max(right, block[2])
+    return columns
+
+
+def _aligned_rows(columns):
+    """Rows of a table when the blocks of every column share their top edges"""
+    if len(columns) < 2:
+        return None
+    rows = []
+    for block in sorted((b for column in columns for b in column), key=lambda b: (b[1], b[0])):
+        if rows and abs(block[1] - rows[-1][0][1]) <= ROW_TOLERANCE:
+            rows[-1].append(block)
+        else:
+            rows.append([block])
+    multi = sum(1 for row in rows if len(row) > 1)
+    # Table cells are single lines or line up row by row; prose columns are neither
+    single_lines = all("\n" not in b[4].strip() for row in rows for b in row)
+    if not single_lines and (len(rows) < 2 or multi < 0.7 * len(rows)):
+        return None
+    return [" | ".join(b[4].replace("\n", " ") for b in sorted(row)) for row in rows]
+
+
+def _segment_text(blocks):
+    """Reading-order text of one horizontal band of blocks"""
+    columns = _columns(blocks)
+    rows = _aligned_rows(columns)
+    if rows is not None:
+        return "\n".join(rows)
+    parts = []
+    for column in columns:
+        column.sort(key=lambda b: (b[1], b[0]))
+        parts.extend(b[4] for b in column)
+    return "\n".join(parts)
+
+
+def layout_text(page, skip_lines=frozenset(), textpage=None):
+    """Reading-order text of a page with tables as rows and skip_lines removed"""
+    width = page.rect.width
+    height = page.rect.height
+    blocks = _text_blocks(page, textpage)
+
+    # Drop repeated header and footer lines
+    if skip_lines:
+        kept = []
+        for b in blocks:
+            if b[3] <= height * MARGIN or b[1] >= height * (1 - MARGIN):
+                lines = [line for line in b[4].splitlines()
+                         if _normalize(line) not in skip_lines]
+                if not lines:
+                    continue
+                b = b[:4] + ("\n".join(lines),)
+            kept.append(b)
+        blocks = kept
+
+    # find_tables reads the page's own text layer, which OCR'd pages lack
+    tables, covered = _find_tables(page, blocks) if textpage is None else ([], set())
+    blocks = [b for i, b in enumerate(blocks) if i not in covered]
+
+    # Full-width blocks (titles, wide paragraphs) and horizontal gaps that no
+    # block crosses separate the page into bands laid out independently
+    pieces = list(tables)
+    band = []
+    bottom = None
+    for block in sorted(blocks, key=lambda b: (b[1], b[0])):
+        full_width = block[2] - block[0] > width * 0.6
+        if band and (full_width or block[1] > bottom):
+            pieces.append((band[0][1], 0, _segment_text(band)))
+            band = []
+        if full_width:
+            pieces.append((block[1], block[0], block[4]))
+            continue
+        bottom = block[3] if not band else max(bottom, block[3])
+        band.append(block)
+    if band:
+        pieces.append((band[0][1], 0, _segment_text(band)))
+
+    pieces.sort(key=lambda piece: (piece[0], piece[1]))
+    text = "\n".join(piece[2] for piece in pieces if piece[2])
+    return text + "\n" if text else ""
+
+
+def extract_page(pdf, number, layout=True):
+    """Text of one page of an open fitz.Document"""
+    if not layout:
+        return pdf[number].get_text()
+    return layout_text(pdf[number], repeated_margin_lines(pdf))
+
+
+def extract_range(path, start, stop, layout=True):
+    """Texts of pages start..stop-1 of a PDF (runs inside a worker process)"""
+    import fitz  # PyMuPDF
+    pdf = fitz.open(path)
+    try:
+        return [extract_page(pdf, number, layout) for number in range(start, stop)]
+    finally:
+        pdf.close()
+
+
+def extract_parallel(path, page_count, workers=None, layout=True, on_chunk=None):
+    """Extract all pages in contiguous ranges spread over worker processes
+
+    on_chunk(pages done, total) is called as ranges finish.
+    """
+    workers = min(workers or os.cpu_count() or 1, max(1, page_count // 16))
+    if workers < 2:
+        return extract_range(path, 0, page_count, layout)
+    # A few ranges per worker keeps them all busy when pages differ in cost
+    size = -(-page_count // (workers * 4))
+    ranges = [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+    pages = [None] * page_count
+    done = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(extract_range, path, start, stop, layout): start
+                   for start, stop in ranges}
+        for future in futures:
+            chunk = future.result()
+            start = futures[future]
+            pages[start:start + len(chunk)] = chunk
+            done += len(chunk)
+            if on_chunk:
+                on_chunk(done, page_count)
+    return pages
+
+
+class ExtractionResult:
+    """Page texts of a PDF with a character-offset index and extraction stats"""
+    def __init__(self, path, pages, elapsed, file_size):
+        self.path = path
+        self.pages = pages
+        self.elapsed = elapsed          # seconds spent extracting
+        self.file_size = file_size      # bytes read from disk
+        self.byte_count = sum(len(text.encode("utf-8")) for text in pages)
+
+        # page_offsets[i] is the character position where page i starts
+        self.page_offsets = []
+        position = 0
+        for text in pages:
+            self.page_offsets.append(position)
+            position += len(text)
+        self.char_count = position
+        self._text = None
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    @property
+    def text(self):
+        """Full document text, joined once on first use"""
+        if self._text is None:
+            self._text = "".join(self.pages)
+        return self._text
+
+    def page_at(self, position):
+        """Index of the page containing character position"""
+        if not 0 <= position < self.char_count:
+            raise IndexError(f"character position {position} out of range")
+        return bisect_right(self.page_offsets, position) - 1
+
+    def page_span(self, number):
+        """(start, end) character positions of a page"""
+        start = self.page_offsets[number]
+        return start, start + len(self.pages[number])
+
+
+def extract_pdf(path, on_page=None, layout=True, workers=None):
+    """Extract every page of a PDF; on_page(number, total) reports progress
+
+    PDFs of PARALLEL_MIN_PAGES pages or more are extracted in worker
+    processes (unless workers is 1); on_page is then called per finished range.
+    """
+    import fitz  # PyMuPDF
+    start = time.perf_counter()
+    pdf = fitz.open(path)
+    try:
+        total = len(pdf)
+        pages = None
+        if total < PARALLEL_MIN_PAGES or workers == 1:
+            pages = []
+            for number in range(total):
+                if on_page:
+                    on_page(number, total)
+                pages.append(extract_page(pdf, number, layout))
+    finally:
+        pdf.close()
+    if pages is None:
+        pages = extract_parallel(path, total, workers, layout, on_page)
+    elapsed = time.perf_counter() - start
+    record("pdf.extract", elapsed, start, pages=total)
+    return ExtractionResult(path, pages, elapsed, os.path.getsize(path))
@@ -0,0 +1,213 @@
+"""
+Structured encounter field extraction.
+
+Most records carry the fields we need (patient, date, provider, reason for
+visit, assessment, plan, medications) under standard labels and section headers,
+so a set of precompiled rules fills them locally in milliseconds. Only the
+fields the rules leave empty are requested from the LLM, as JSON.
+"""
+import re
+import csv
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from tokens import prompt_budget, split_tokens
+
+FIELDS = ("patient", "date", "provider", "reason", "assessment", "plan", "medications")
+
+_DATE = (r"(\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|"
+         r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2},? \d{4})")
+
+# Labels that name the date of service; tried before a generic "Date:"
+_SERVICE_DATE_RULE = re.compile(
+    r"\b(?:date of (?:service|visit)|dos|visit date|encounter date|service date)"
+    r"\s*[:\-]\s*" + _DATE, re.IGNORECASE)
+
+_DATE_RULE = re.compile(r"\bdate\s*[:\-]\s*" + _DATE, re.IGNORECASE)
+
+# Right before a generic "Date:", marks it as the date of birth ("Birth Date:", "DOB Date:")
+_BIRTH_LABEL = re.compile(r"\b(?:birth|dob|d\.o\.b\.?)[\s/_-]*$", re.IGNORECASE)
+
+_PATIENT_RULE = re.compile(
+    r"^[ \t]*(?:patient name|patient|pt name)[ \t]*:[ \t]*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+# Whatever follows the name on the same line (wide gaps, table cells, other labels)
+_PATIENT_END = re.compile(
+    r"\s{2,}|\s\|\s|\b(?:dob|d\.o\.b|date of birth|mrn|age|sex|gender|account)\b", re.IGNORECASE)
+
+_PROVIDER_RULE = re.compile(
+    r"^[ \t]*(?:rendering provider|attending physician|attending|provider|physician|"
+    r"clinician|seen by|signed by)[ \t]*:[ \t]*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+# Section headers that start a field, in the order they are tried
+_SECTION_FIELDS = {
+    "reason": ["chief complaint", "reason for visit", "reason for encounter", "cc"],
+    "assessment": ["assessment and plan", "assessment & plan", "assessment", "impression",
+                   "diagnosis", "diagnoses"],
+    "plan": ["plan", "recommendations"],
+    "medications": ["current medications", "medications", "meds", "discharge medications"],
+}
+
+# Other common headers; they only end the previous section
+_OTHER_HEADERS = ["history of present illness", "hpi", "review of systems", "ros",
+                  "physical exam", "physical examination", "exam", "vitals", "vital signs",
+                  "allergies", "past medical history", "pmh", "social history",
+                  "family history", "labs", "results", "procedures", "follow up", "follow-up",
+                  "patient", "provider", "date of service"]
+
+_HEADER_FIELD = {header: name for name, headers in _SECTION_FIELDS.items() for header in headers}
+_ALL_HEADERS = sorted(set(_HEADER_FIELD) | set(_OTHER_HEADERS), key=len, reverse=True)
+_HEADER_RULE = re.compile(
+    r"^[ \t]*(" + "|".join(re.escape(h) for h in _ALL_HEADERS) + r")[ \t]*:[ \t]*",
+    re.IGNORECASE | re.MULTILINE)
+
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+FIELD_PROMPT = ("Extract the following fields from this medical document: {fields}. "
+                "Reply with a single JSON object using exactly those keys. Use a list of "
+                "strings for medications and null for anything not stated.\n\n{text}")
+
+
+@dataclass
+class EncounterRecord:
+    """Structured fields of one medical document"""
+    patient: Optional[str] = None
+    date: Optional[str] = None
+    provider: Optional[str] = None
+    reason: Optional[str] = None
+    assessment: Optional[str] = None
+    plan: Optional[str] = None
+    medications: List[str] = field(default_factory=list)
+    sources: Dict[str, str] = field(default_factory=dict)  # field -> "rules" or "llm"
+
+    def missing(self):
+        """Names of fields that are still empty"""
+        return [name for name in FIELDS if not getattr(self, name)]
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _sections(text):
+    """{field: section text} for the first header of each field"""
+    matches = list(_HEADER_RULE.finditer(text))
+    sections = {}
+    for i, match in enumerate(matches):
+        name = _HEADER_FIELD.get(match.group(1).lower())
+        if name is None or name in sections:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        # A blank line ends the section even without a following header
+        body = re.split(r"\n\s*\n", body, maxsplit=1)[0].strip()
+        if body:
+            sections[name] = body
+    return sections
+
+
+def _medication_list(body):
+    items = []
+    for line in body.splitlines():
+        line = _LIST_ITEM.sub("", line).strip()
+        items.extend(part.strip() for part in line.split(";") if part.strip())
+    return items
+
+
+def find_date(text):
+    """First labelled date of service in text, or None; dates of birth are skipped"""
+    match = _SERVICE_DATE_RULE.search(text)
+    if match:
+        return match.group(1)
+    for match in _DATE_RULE.finditer(text):
+        if not _BIRTH_LABEL.search(text, max(0, match.start() - 16), match.start()):
+            return match.group(1)
+    return None
+
+
+def find_patient(text):
+    """First labelled patient name in text, or None"""
+    for match in _PATIENT_RULE.finditer(text):
+        name = _PATIENT_END.split(match.group(1), maxsplit=1)[0].strip(" ,;:")
+        if name:
+            return name
+    return None
+
+
+def extract_fields(text):
+    """Fill an EncounterRecord from text using the local rules only"""
+    record = EncounterRecord()
+    record.patient = find_patient(text)
+    record.date = find_date(text)
+    match = _PROVIDER_RULE.search(text)
+    if match:
+        record.provider = match.group(1).strip()
+
+    sections = _sections(text)
+    for name in ("reason", "assessment", "plan"):
+        if name in sections:
+            setattr(record, name, " ".join(sections[name].split()))
+    if "medications" in sections:
+        record.medications = _medication_list(sections["medications"])
+    # A combined "Assessment and Plan" section fills both fields
+    if record.assessment and not record.plan and re.search(
+            r"assessment\s*(?:and|&)\s*plan", text, re.IGNORECASE):
+        record.plan = record.assessment
+
+    record.sources = {name: "rules" for name in FIELDS if getattr(record, name)}
+    return record
+
+
+def _parse_json_object(reply):
+    """First JSON object in an LLM reply"""
+    start = reply.find("{")
+    end = reply.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in reply")
+    return json.loads(reply[start:end + 1])
+
+
+def _apply_llm_fields(record, values, names):
+    for name in names:
+        value = values.get(name)
+        if not value:
+            continue
+        if name == "medications":
+            value = [str(item) for item in value] if isinstance(value, list) else [str(value)]
+        else:
+            value = str(value)
+        setattr(record, name, value)
+        record.sources[name] = "llm"
+
+
+async def fill_missing_fields(record, text, complete, model="gpt-3.5-turbo"):
+    """Ask the LLM (async complete(messages)) for the fields the rules left empty
+
+    Only as much of the start of the text as fits model's context window
+    is sent. Nothing is sent for a document without text.
+    """
+    missing = record.missing()
+    if not missing or not text.strip():
+        return record
+    template = FIELD_PROMPT.format(fields=", ".join(missing), text="")
+    text = split_tokens(text, prompt_budget(model, template), model)[0]
+    prompt = FIELD_PROMPT.format(fields=", ".join(missing), text=text)
+    messages = [{"role": "user", "content": prompt}]
+    _apply_llm_fields(record, _parse_json_object(await complete(messages)), missing)
+    return record
+
+
+def records_to_json(records, file):
+    """Write {filename: record} as a JSON object"""
+    json.dump({name: record.to_dict() for name, record in records.items()}, file, indent=2)
+
+
+def records_to_csv(records, file):
+    """Write {filename: record} as CSV, one row per document"""
+    writer = csv.writer(file)
+    writer.writerow(("filename",) + FIELDS)
+    for name, record in records.items():
+        writer.writerow([name] + [
+            "; ".join(record.medications) if field_name == "medications"
+            else getattr(record, field_name) or ""
+            for field_name in FIELDS])
@@ -0,0 +1,225 @@
+"""
+Background ingestion of PDF documents.
+
+PDFs are hashed, looked up in the extraction cache and, if unknown, opened
+and validated in a pool of worker processes so that large uploads are
+spread across all cores, while a QThread collects the results
+and streams each finished document back to the GUI thread through Qt
+signals. Page text itself is extracted lazily by MedicalDocument.
+
+IndexWorker adds loaded documents to the full-text search index in the
+background, and OCRWorker runs OCR on scanned pages in a process pool of
+its own so that it never holds up ingestion.
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from cache import file_hash, get_cache
+from instrumentation import count, record, span
+from ocr import ocr_page
+
+
+def inspect_document(path):
+    """Hash a PDF and return (content hash, page count, seconds taken) (runs inside a worker process)"""
+    start = time.perf_counter()
+    content_hash = file_hash(path)
+    cache = get_cache()
+    page_count = cache.get_page_count(content_hash) if cache else None
+    if page_count is None:
+        import fitz  # PyMuPDF
+        doc = fitz.open(path)
+        try:
+            page_count = len(doc)
+        finally:
+            doc.close()
+        if cache:
+            cache.put_document(content_hash, page_count)
+    return content_hash, page_count, time.perf_counter() - start
+
+
+class IngestionWorker(QThread):
+    """Thread that ingests a batch of PDFs in a process pool"""
+    document_ready = pyqtSignal(str, str, int)  # path, content hash, page count
+    document_failed = pyqtSignal(str, str)  # path, error message
+    progress = pyqtSignal(int, int, str)    # done, total, filename
+
+    # How often the collector wakes up to check for cancellation (seconds)
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, paths, max_workers=None):
+        super().__init__()
+        self.paths = list(paths)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._cancelled = False
+
+    def cancel(self):
+        """Request cancellation; files already being opened are discarded"""
+        self._cancelled = True
+
+    def run(self):
+        total = len(self.paths)
+        if not total:
+            return
+
+        # "spawn" avoids forking a process that is running Qt threads
+        context = multiprocessing.get_context("spawn")
+        workers = min(self.max_workers, total)
+        done = 0
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = {pool.submit(inspect_document, path): path for path in self.paths}
+
+            while pending and not self._cancelled:
+                finished, _ = wait(pending, timeout=self.POLL_INTERVAL,
+                                   return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = pending.pop(future)
+                    done += 1
+                    try:
+                        content_hash, page_count, seconds = future.result()
+                    except Exception as e:
+                        self.document_failed.emit(path, str(e))
+                    else:
+                        # Hashing and opening in the worker, without the wait for a free one
+                        record("ingest.document", seconds)
+                        self.document_ready.emit(path, content_hash, page_count)
+                    self.progress.emit(done, total, os.path.basename(path))
+
+            # Drop anything that has not started yet so the pool shuts down quickly
+            for future in pending:
+                future.cancel()
+        record("ingest.batch", time.perf_counter() - start)
+
+
+class IndexWorker(QThread):
+    """Thread that indexes documents as they are added, reusing postings saved in earlier sessions"""
+    document_indexed = pyqtSignal(str)  # content hash
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+
+    def add(self, document, replace=False):
+        """Queue a MedicalDocument for indexing; replace re-indexes one already indexed"""
+        self._queue.put((document, replace, time.perf_counter()))
+
+    def stop(self):
+        """Stop after the page being read; the current and queued documents are left unindexed"""
+        self._stopping.set()
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        pruned = False
+        while not self._stopping.is_set():
+            item = self._queue.get()
+            if item is None:
+                break
+            if not pruned:
+                # Postings of documents evicted from the extraction cache go with them.
+                # Not done at startup: opening the cache imports PyMuPDF
+                cache = get_cache()
+                if cache:
+                    self.index.retain(cache.known_hashes())
+                pruned = True
+            document, replace, queued = item
+            record("index.queue_wait", time.perf_counter() - queued)
+            if replace or not self.index.load_document(document.content_hash):
+                try:
+                    with span("index.document", pages=document.page_count):
+                        document.load_pages()
+                        pages = []
+                        for number in range(document.page_count):
+                            if self._stopping.is_set():
+                                return
+                            pages.append(document.page_text(number))
+                        # Pages still waiting for OCR would be saved as blank and, once
+                        # the saved postings are reused, never queued for OCR again
+                        self.index.add_document(document.content_hash, pages, replace,
+                                                persist=not document.pending_ocr)
+                except Exception as e:
+                    print(f"Error indexing {document.path}: {e}")
+                    continue
+            self.document_indexed.emit(document.content_hash)
+
+
+class OCRWorker(QThread):
+    """Thread that OCRs queued scanned pages in its own process pool"""
+    page_ready = pyqtSignal(str, int)        # document path, page number
+    page_failed = pyqtSignal(str, int, str)  # document path, page number, error message
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, max_workers=None):
+        super().__init__()
+        # Half the cores by default, leaving the rest to ingestion and the GUI
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) // 2)
+        self._queue = queue.Queue()
+        self._queued = set()  # (path, page number) waiting or running
+        self._lock = threading.Lock()
+
+    def add(self, document, number, image_hash):
+        """Queue a page of a MedicalDocument; may be called from any thread"""
+        key = (document.path, number)
+        with self._lock:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        self._queue.put((document, number, image_hash, time.perf_counter()))
+        count("ocr.queued")
+
+    def stop(self):
+        """Drop queued pages and stop"""
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        running = {}
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.POLL_INTERVAL if running else None)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    document, number, _, queued = item
+                    record("ocr.queue_wait", time.perf_counter() - queued)
+                    running[pool.submit(ocr_page, document.path, number)] = item
+                for future in [future for future in running if future.done()]:
+                    self._finish(running.pop(future), future)
+        finally:
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _finish(self, item, future):
+        document, number, image_hash, queued = item
+        # From queueing to the text being available, including time in the pool
+        record("ocr.page", time.perf_counter() - queued)
+        with self._lock:
+            self._queued.discard((document.path, number))
+        try:
+            text = future.result()
+        except Exception as e:
+            document.pending_ocr.discard(number)
+            self.page_failed.emit(document.path, number, str(e))
+            return
+        cache = get_cache()
+        if cache:
+            cache.put_ocr(image_hash, text)
+        document.set_page_text(number, text)
+        document.pending_ocr.discard(number)
+        self.page_ready.emit(document.path, number)
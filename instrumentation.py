@@ -0,0 +1,150 @@
+"""
+Lightweight timers and counters for the hot paths.
+
+Timers and counters are always aggregated, which costs a perf_counter call
+and a dict update per event. Individual events are only kept while tracing
+is on, and can be exported in the Chrome trace-event format (open the file
+in chrome://tracing or https://ui.perfetto.dev).
+
+    with span("pdf.open", path=path):
+        ...
+    record("llm.request", seconds)
+    count("page.extracted")
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+
+class TimerStats:
+    """Count, total and maximum of the durations recorded under one name"""
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class Instrumentation:
+    """Process-wide registry of timers, counters and (optionally) trace events"""
+    def __init__(self, max_events=500000):
+        self.max_events = max_events
+        self.timers = {}    # name -> TimerStats
+        self.counters = {}  # name -> int
+        self._events = None  # deque of trace events while tracing
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @property
+    def tracing(self):
+        return self._events is not None
+
+    def start_trace(self):
+        """Start keeping individual events (the oldest are dropped past max_events)"""
+        with self._lock:
+            if self._events is None:
+                self._events = deque(maxlen=self.max_events)
+
+    def stop_trace(self):
+        with self._lock:
+            self._events = None
+
+    def record(self, name, seconds, start=None, **args):
+        """Add a duration; start is its perf_counter start time if known"""
+        with self._lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.add(seconds)
+            if self._events is not None:
+                if start is None:
+                    start = time.perf_counter() - seconds
+                self._events.append(
+                    ("X", name, start, seconds, threading.get_ident(), args or None))
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start, **args)
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function"""
+        def decorate(function):
+            label = name or f"{function.__module__}.{function.__qualname__}"
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(label):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1):
+        """Increment a counter"""
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + n
+            if self._events is not None:
+                self._events.append(
+                    ("C", name, time.perf_counter(), value, threading.get_ident(), None))
+
+    def snapshot(self):
+        """{"timers": {name: stats}, "counters": {name: value}} of everything so far"""
+        with self._lock:
+            timers = {
+                name: {"count": s.count, "total": s.total,
+                       "mean": s.total / s.count if s.count else 0.0, "max": s.max}
+                for name, s in self.timers.items()
+            }
+            return {"timers": timers, "counters": dict(self.counters)}
+
+    def reset(self):
+        """Clear all timers, counters and trace events"""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+            if self._events is not None:
+                self._events.clear()
+
+    def export_chrome_trace(self, path):
+        """Write the trace events (and final statistics) as Chrome trace-event JSON"""
+        with self._lock:
+            events = list(self._events or ())
+        pid = os.getpid()
+        trace = []
+        for phase, name, start, value, tid, args in events:
+            event = {"name": name, "cat": name.split(".", 1)[0], "ph": phase,
+                     "ts": round((start - self._origin) * 1e6, 1), "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = round(value * 1e6, 1)
+                if args:
+                    event["args"] = {key: str(item) for key, item in args.items()}
+            else:
+                event["args"] = {name: value}
+            trace.append(event)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms",
+                       "otherData": self.snapshot()}, file)
+        return len(trace)
+
+
+instrumentation = Instrumentation()
+
+span = instrumentation.span
+record = instrumentation.record
+count = instrumentation.count
+timed = instrumentation.timed
@@ -0,0 +1,48 @@
+"""
+Settings and helpers shared by the OpenAI chat completion clients.
+
+The API base can be pointed at any OpenAI-compatible server (for example
+mock_openai_server.py) with the OPENAI_API_BASE environment variable.
+Requests can share a token-bucket rate limiter and retry rate-limit and
+server errors with exponential backoff (see llm_client.py).
+"""
+import os
+import time
+import random
+import threading
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+
+SYSTEM_PROMPT = ("You are a medical assistant summarizing patient encounters. Identify key "
+                 "information including: date, provider, reason for visit, assessment, plan, "
+                 "and medications.")
+
+
+def default_api_base():
+    """API base URL, overridable for local stand-in servers"""
+    return os.environ.get("OPENAI_API_BASE") or DEFAULT_API_BASE
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by concurrent requests"""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate                    # tokens added per second
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with jitter for the given retry attempt (0-based)"""
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
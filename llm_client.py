@@ -0,0 +1,212 @@
+"""
+Asyncio client for OpenAI-compatible chat completion APIs.
+
+All requests share one aiohttp session, so connections are kept alive and
+reused instead of opening a new HTTPS connection per summary. The client
+works against the real API or any compatible stand-in such as
+mock_openai_server.py, and records the latency of every request as well
+as the estimated and reported token usage. Completions can be streamed,
+delivering text to a callback as it arrives.
+"""
+import json
+import time
+import asyncio
+
+from instrumentation import count, record
+from llm import DEFAULT_MODEL, backoff_delay, default_api_base
+from tokens import count_message_tokens
+
+
+class LLMClientError(Exception):
+    """A chat completion request failed"""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self):
+        return self.status is not None and (self.status == 429 or self.status >= 500)
+
+
+class LatencyMetrics:
+    """Per-request latencies (seconds) and error counts"""
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.retries = 0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        """Summary statistics of all recorded requests"""
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def percentile(p):
+            return latencies[min(count - 1, int(p * count))] if count else 0.0
+
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean": sum(latencies) / count if count else 0.0,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": latencies[-1] if count else 0.0,
+        }
+
+
+class TokenUsage:
+    """Prompt tokens estimated before sending and tokens reported by the API"""
+    def __init__(self):
+        self.requests = 0
+        self.estimated = 0    # local count of prompt tokens
+        self.prompt = 0       # reported by the API
+        self.completion = 0
+        self.unreported = 0   # requests whose response carried no usage
+
+    def add(self, other):
+        for name in ("requests", "estimated", "prompt", "completion", "unreported"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self):
+        return {"requests": self.requests, "estimated": self.estimated, "prompt": self.prompt,
+                "completion": self.completion, "unreported": self.unreported}
+
+    def describe(self):
+        """One-line report for the status bar and logs"""
+        text = (f"~{self.estimated:,} prompt tokens estimated, {self.prompt:,} prompt + "
+                f"{self.completion:,} completion reported over {self.requests} request(s)")
+        if self.unreported:
+            text += f" ({self.unreported} without usage)"
+        return text
+
+
+class AsyncLLMClient:
+    """Chat completion client with a persistent keep-alive connection pool"""
+    def __init__(self, api_key, model=DEFAULT_MODEL, api_base=None, max_connections=16,
+                 rate_limiter=None, max_retries=5, base_delay=1.0, timeout=120):
+        self.api_key = api_key
+        self.model = model
+        self.url = (api_base or default_api_base()).rstrip("/") + "/chat/completions"
+        self.max_connections = max_connections
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.timeout = timeout
+        self.metrics = LatencyMetrics()
+        self.usage = TokenUsage()  # every request made by this client
+        self._session = None
+
+    def _get_session(self):
+        # Created lazily so the session belongs to the loop that uses it
+        import aiohttp  # slow to import, so only loaded when a request is made
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        return self._session
+
+    async def _post(self, payload):
+        session = self._get_session()
+        start = time.perf_counter()
+        async with session.post(self.url, json=payload) as response:
+            if response.status != 200:
+                raise LLMClientError(
+                    f"HTTP {response.status}: {await response.text()}", response.status)
+            data = await response.json()
+        self.metrics.record(time.perf_counter() - start)
+        record("llm.request", time.perf_counter() - start, start)
+        return data
+
+    async def _stream(self, payload, on_token, received):
+        """POST a streaming request, passing each text delta to on_token; returns (text, usage)"""
+        session = self._get_session()
+        start = time.perf_counter()
+        usage = None
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        async with session.post(self.url, json=payload) as response:
+            if response.status != 200:
+                raise LLMClientError(
+                    f"HTTP {response.status}: {await response.text()}", response.status)
+            # Server-sent events: one "data: {...}" line per chunk, ending with [DONE]
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                # The last chunk carries the usage and no choices
+                usage = chunk.get("usage") or usage
+                if not chunk.get("choices"):
+                    continue
+                delta = chunk["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    received.append(delta)
+                    on_token(delta)
+        self.metrics.record(time.perf_counter() - start)
+        record("llm.stream", time.perf_counter() - start, start)
+        return "".join(received), usage
+
+    def _record_usage(self, estimated, reported, usage):
+        request = TokenUsage()
+        request.requests = 1
+        request.estimated = estimated
+        if reported:
+            request.prompt = reported.get("prompt_tokens", 0)
+            request.completion = reported.get("completion_tokens", 0)
+        else:
+            request.unreported = 1
+        self.usage.add(request)
+        if usage is not None:
+            usage.add(request)
+
+    async def complete(self, messages, on_token=None, usage=None):
+        """Send one chat completion request and return the reply text
+
+        With on_token the reply is streamed and on_token(text) is called for
+        every fragment as it arrives. The request's token usage is added to
+        self.usage and, if given, to usage (a TokenUsage).
+        """
+        import aiohttp
+        payload = {"model": self.model, "messages": messages}
+        # Counted before sending, so the estimate is known even if the request fails
+        estimated = count_message_tokens(messages, self.model)
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                delay = self.rate_limiter.reserve()
+                if delay:
+                    record("llm.rate_limit_wait", delay)
+                    await asyncio.sleep(delay)
+            received = []
+            try:
+                if on_token:
+                    reply, reported = await self._stream(payload, on_token, received)
+                else:
+                    data = await self._post(payload)
+                    reply, reported = data["choices"][0]["message"]["content"], data.get("usage")
+                self._record_usage(estimated, reported, usage)
+                return reply
+            except (LLMClientError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.metrics.errors += 1
+                retryable = not isinstance(e, LLMClientError) or e.retryable
+                # A stream that already delivered text cannot be replayed cleanly
+                if attempt >= self.max_retries or not retryable or received:
+                    raise
+                self.metrics.retries += 1
+                count("llm.retry")
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay))
+                attempt += 1
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
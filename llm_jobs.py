@@ -0,0 +1,211 @@
+"""
+LLM work for the main window, run on a shared asyncio event loop.
+
+main.py imports this module on first use (and preloads it in the
+background once the window is shown), so asyncio, aiohttp and the
+summarization stack stay off the startup path.
+"""
+import time
+import asyncio
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from aggregation import format_timeline, group_encounters, summarize_encounters
+from fields import fill_missing_fields
+from instrumentation import record
+from llm_client import TokenUsage
+from summarization import summarize_document
+
+class AsyncLoopThread(QThread):
+    """Runs the asyncio event loop shared by all LLM requests"""
+    def __init__(self):
+        super().__init__()
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.wait()
+
+
+class LLMSummarizer(QObject):
+    """Summarizes one document on the shared LLM event loop"""
+    summary_ready = pyqtSignal(str, str, bool)  # content hash, summary, from cache
+    summary_failed = pyqtSignal(str, str)       # content hash, error message
+    summary_chunk = pyqtSignal(str, str)        # content hash, streamed text fragment
+    usage_report = pyqtSignal(str, str)         # content hash, token usage description
+    finished = pyqtSignal()
+
+    def __init__(self, document, client, loop_thread):
+        super().__init__()
+        self.document = document
+        self.client = client
+        self.loop_thread = loop_thread
+        self.usage = TokenUsage()
+        self.future = None
+
+    def start(self):
+        self.future = self.loop_thread.submit(self.run())
+
+    async def run(self):
+        try:
+            summary, from_cache = await summarize_document(
+                self.document, self.client,
+                on_token=lambda text: self.summary_chunk.emit(self.document.content_hash, text),
+                usage=self.usage)
+            self.summary_ready.emit(self.document.content_hash, summary, from_cache)
+            if not from_cache:
+                self.usage_report.emit(self.document.content_hash, self.usage.describe())
+        except Exception as e:
+            self.summary_failed.emit(self.document.content_hash, str(e))
+        finally:
+            self.finished.emit()
+
+
+class BatchSummarizer(QObject):
+    """Summarizes many documents on the shared LLM event loop with bounded concurrency"""
+    summary_ready = pyqtSignal(str, str, bool)  # content hash, summary, from cache
+    summary_failed = pyqtSignal(str, str)       # content hash, error message
+    usage_report = pyqtSignal(str, str)         # content hash, token usage description
+    progress = pyqtSignal(int, int)             # done, total
+    finished = pyqtSignal()
+
+    def __init__(self, documents, client, loop_thread, concurrency=4):
+        super().__init__()
+        self.documents = list(documents)
+        self.client = client
+        self.loop_thread = loop_thread
+        self.concurrency = concurrency
+        self.usage = TokenUsage()  # totals over the batch
+        self.future = None
+
+    def start(self):
+        self.future = self.loop_thread.submit(self.run())
+
+    def cancel(self):
+        """Cancel the batch, including requests in flight"""
+        if self.future is not None:
+            self.future.cancel()
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        total = len(self.documents)
+        done = 0
+
+        async def summarize(document):
+            nonlocal done
+            usage = TokenUsage()
+            queued = time.perf_counter()
+            error = None
+            async with semaphore:
+                record("batch.queue_wait", time.perf_counter() - queued)
+                try:
+                    summary, from_cache = await summarize_document(
+                        document, self.client, usage=usage)
+                except Exception as e:
+                    error = str(e)
+            if usage.requests:
+                self.usage_report.emit(document.content_hash, usage.describe())
+            self.usage.add(usage)
+            done += 1
+            if error is None:
+                self.summary_ready.emit(document.content_hash, summary, from_cache)
+            else:
+                self.summary_failed.emit(document.content_hash, error)
+            self.progress.emit(done, total)
+
+        try:
+            await asyncio.gather(*(summarize(doc) for doc in self.documents))
+        finally:
+            self.finished.emit()
+
+
+class FieldExtractor(QObject):
+    """Extracts structured fields on the shared LLM event loop; the LLM only fills gaps"""
+    record_ready = pyqtSignal(str)  # content hash
+    finished = pyqtSignal()
+
+    def __init__(self, documents, client, loop_thread, concurrency=4):
+        super().__init__()
+        self.documents = list(documents)
+        self.client = client  # None for rules only
+        self.loop_thread = loop_thread
+        self.concurrency = concurrency
+        self.future = None
+
+    def start(self):
+        self.future = self.loop_thread.submit(self.run())
+
+    def cancel(self):
+        """Cancel the extraction, including LLM requests in flight"""
+        if self.future is not None:
+            self.future.cancel()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def extract(document):
+            try:
+                record = await loop.run_in_executor(None, document.extract_fields)
+                if self.client is not None and record.missing():
+                    async with semaphore:
+                        await fill_missing_fields(record, document.text_content,
+                                                  self.client.complete, self.client.model)
+            except Exception as e:
+                print(f"Error extracting fields from {document.path}: {e}")
+            self.record_ready.emit(document.content_hash)
+
+        try:
+            await asyncio.gather(*(extract(doc) for doc in self.documents))
+        finally:
+            self.finished.emit()
+
+
+class EncounterAggregator(QObject):
+    """Groups documents into a deduplicated encounter timeline and summarizes each encounter"""
+    timeline_ready = pyqtSignal(str, str)  # timeline text, description
+    progress = pyqtSignal(int, int)        # encounters summarized, total
+    finished = pyqtSignal()
+
+    def __init__(self, documents, client, loop_thread, concurrency=4):
+        super().__init__()
+        self.documents = list(documents)
+        self.client = client  # None to group without summaries
+        self.loop_thread = loop_thread
+        self.concurrency = concurrency
+        self.usage = TokenUsage()
+        self.future = None
+
+    def start(self):
+        self.future = self.loop_thread.submit(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # Page extraction and hashing block, so grouping runs off the event loop
+            aggregation = await loop.run_in_executor(None, group_encounters, self.documents)
+            self.timeline_ready.emit(format_timeline(aggregation), aggregation.describe())
+            if self.client is not None and aggregation.encounters:
+                total = len(aggregation.encounters)
+                done = 0
+
+                def report(encounter):
+                    nonlocal done
+                    done += 1
+                    self.progress.emit(done, total)
+
+                await summarize_encounters(aggregation, self.client, usage=self.usage,
+                                           concurrency=self.concurrency, on_summary=report)
+                self.timeline_ready.emit(format_timeline(aggregation), aggregation.describe())
+        except Exception as e:
+            self.timeline_ready.emit("", f"Error building timeline: {e}")
+        finally:
+            self.finished.emit()
@@ -1,65 +1,81 @@
 import sys
 import os
 import json
+import cProfile
+import argparse
+import functools
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QTextEdit, QListWidget, QFileDialog, 
-                            QSplitter, QTabWidget)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-import openai
-import fitz  # PyMuPDF
+                            QSplitter, QTabWidget, QProgressBar, QSpinBox, QLineEdit,
+                            QListWidgetItem, QTableWidget, QTableWidgetItem, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QTextCursor
 
-class MedicalDocument:
-    """Class representing a medical document"""
-    def __init__(self, path):
-        self.path = path
-        self.filename = os.path.basename(path)
-        self.text_content = self.extract_text()
-        self.summary = ""
-    
-    def extract_text(self):
-        """Extract text from PDF document"""
-        try:
-            doc = fitz.open(self.path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            return text
-        except Exception as e:
-            print(f"Error extracting text from {self.path}: {e}")
-            return ""
-
-class LLMSummarizer(QThread):
-    """Thread for handling LLM API calls"""
-    summary_ready = pyqtSignal(str, str)  # filename, summary
-    
-    def __init__(self, document, api_key):
-        super().__init__()
-        self.document = document
-        openai.api_key = api_key
-        
-    def run(self):
-        try:
-            # Simple prompt for summarization
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a medical assistant summarizing patient encounters. Identify key information including: date, provider, reason for visit, assessment, plan, and medications."},
-                    {"role": "user", "content": f"Summarize this medical document:\n\n{self.document.text_content[:4000]}"}  # Limit for API
-                ]
-            )
-            summary = response.choices[0].message.content
-            self.document.summary = summary
-            self.summary_ready.emit(self.document.filename, summary)
-        except Exception as e:
-            self.summary_ready.emit(self.document.filename, f"Error generating summary: {e}")
+import document
+from document import MedicalDocument
+from fields import FIELDS, EncounterRecord, records_to_csv, records_to_json
+from instrumentation import instrumentation, timed
+from ingestion import IndexWorker, IngestionWorker, OCRWorker
+from page_viewer import PagedDocumentView
+from search_index import open_index, tokenize
+from session import SessionReader, SessionSaver
+from watcher import FolderWatcher
 
 class POWParserApp(QMainWindow):
     """Main application window"""
     def __init__(self):
         super().__init__()
-        self.documents = {}  # filename -> MedicalDocument
+        # Documents are keyed by content hash, so same-named files from
+        # different folders do not collide and copies are loaded once
+        self.documents = {}  # content hash -> MedicalDocument
+        self.paths = {}  # path -> content hash of the file when it was last ingested
+        self.list_items = {}  # content hash -> doc_list item
+        self.field_items = {}  # content hash -> first-column item of its fields_table row
         self.api_key = ""
+        self.ingestion = None
+        self.pending_paths = []  # arrived while an ingestion was running
+        self.auto_summary_paths = set()  # watched files to summarize once ingested
+        self.auto_summary_queue = []  # content hashes waiting for a watch-mode batch
+        self.summarizers = set()  # running LLMSummarizer jobs
+        self.batch = None
+        
+        # One event loop and connection pool serve every LLM request; both
+        # are created on first use so the LLM stack is not on the startup path
+        self.llm_loop = None
+        self.llm_client = None
+        self.field_extractor = None
+        self.aggregator = None
+        
+        # Open session files; their documents read page text from them lazily
+        self.sessions = []
+        self.session_saver = None
+        
+        # Streamed summary text is buffered and flushed to the widget periodically
+        self.stream_buffer = []
+        self.stream_hash = None
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(50)
+        self.stream_timer.timeout.connect(self.flush_summary_stream)
+        
+        # Full-text index, loaded and extended in the background
+        self.search_index = open_index()
+        self.index_worker = IndexWorker(self.search_index)
         self.initUI()
+        self.index_worker.document_indexed.connect(self.update_index_status)
+        self.index_worker.start()
+        
+        # Scanned pages are queued for OCR as they are first read
+        self.ocr_worker = OCRWorker()
+        self.ocr_worker.page_ready.connect(self.ocr_page_ready)
+        self.ocr_worker.page_failed.connect(self.ocr_page_failed)
+        self.ocr_worker.start()
+        document.ocr_handler = self.ocr_worker.add
+        
+        # Intake folders are watched for new and changed PDFs
+        self.folder_watcher = FolderWatcher(self)
+        self.folder_watcher.files_changed.connect(self.ingest_watched_files)
         
     def initUI(self):
         """Initialize the user interface"""
@@ -78,19 +94,70 @@ class POWParserApp(QMainWindow):
         self.upload_btn = QPushButton("Upload Documents")
         self.upload_btn.clicked.connect(self.upload_documents)
         
+        # Folder watch mode
+        self.watch_btn = QPushButton("Watch Folder...")
+        self.watch_btn.clicked.connect(self.watch_folder)
+        self.stop_watch_btn = QPushButton("Stop Watching")
+        self.stop_watch_btn.clicked.connect(self.stop_watching)
+        self.stop_watch_btn.setEnabled(False)
+        watch_layout = QHBoxLayout()
+        watch_layout.addWidget(self.watch_btn)
+        watch_layout.addWidget(self.stop_watch_btn)
+        self.auto_summary_check = QCheckBox("Summarize new documents")
+        self.watch_label = QLabel()
+        self.watch_label.setWordWrap(True)
+        self.watch_label.setVisible(False)
+        
+        # Session files
+        self.save_session_btn = QPushButton("Save Session...")
+        self.save_session_btn.clicked.connect(self.save_session)
+        self.open_session_btn = QPushButton("Open Session...")
+        self.open_session_btn.clicked.connect(self.open_session)
+        session_layout = QHBoxLayout()
+        session_layout.addWidget(self.save_session_btn)
+        session_layout.addWidget(self.open_session_btn)
+        
         self.api_key_edit = QTextEdit()
         self.api_key_edit.setPlaceholderText("Enter OpenAI API Key")
         self.api_key_edit.setMaximumHeight(60)
         
+        # Ingestion progress
+        self.ingest_label = QLabel()
+        self.ingest_progress = QProgressBar()
+        self.cancel_ingest_btn = QPushButton("Cancel")
+        self.cancel_ingest_btn.clicked.connect(self.cancel_ingestion)
+        ingest_layout = QHBoxLayout()
+        ingest_layout.addWidget(self.ingest_progress)
+        ingest_layout.addWidget(self.cancel_ingest_btn)
+        self.set_ingestion_visible(False)
+        
         # Document list
         self.doc_list = QListWidget()
         self.doc_list.itemClicked.connect(self.display_document)
         
+        # Full-text search
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('Search documents (use "quotes" for phrases)')
+        self.search_edit.returnPressed.connect(self.run_search)
+        self.search_results = QListWidget()
+        self.search_results.itemClicked.connect(self.open_search_result)
+        self.search_results.setVisible(False)
+        self.index_label = QLabel()
+        
         left_layout.addWidget(QLabel("OpenAI API Key:"))
         left_layout.addWidget(self.api_key_edit)
         left_layout.addWidget(self.upload_btn)
+        left_layout.addLayout(watch_layout)
+        left_layout.addWidget(self.auto_summary_check)
+        left_layout.addWidget(self.watch_label)
+        left_layout.addLayout(session_layout)
+        left_layout.addWidget(self.ingest_label)
+        left_layout.addLayout(ingest_layout)
         left_layout.addWidget(QLabel("Documents:"))
         left_layout.addWidget(self.doc_list)
+        left_layout.addWidget(self.search_edit)
+        left_layout.addWidget(self.search_results)
+        left_layout.addWidget(self.index_label)
         left_panel.setLayout(left_layout)
         
         # Center and right area with tabs
@@ -102,9 +169,8 @@ class POWParserApp(QMainWindow):
         
         splitter = QSplitter(Qt.Vertical)
         
-        # Document preview area
-        self.doc_preview = QTextEdit()
-        self.doc_preview.setReadOnly(True)
+        # Document preview area (renders only the pages around the visible one)
+        self.doc_preview = PagedDocumentView()
         
         # Summary area
         summary_widget = QWidget()
@@ -115,6 +181,34 @@ class POWParserApp(QMainWindow):
         self.generate_btn.clicked.connect(self.generate_summary)
         summary_layout.addWidget(self.summary_text)
         summary_layout.addWidget(self.generate_btn)
+        
+        # Batch summarization panel
+        batch_layout = QHBoxLayout()
+        self.summarize_all_btn = QPushButton("Summarize All")
+        self.summarize_all_btn.clicked.connect(self.summarize_all)
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 32)
+        self.concurrency_spin.setValue(4)
+        self.rate_spin = QSpinBox()
+        self.rate_spin.setRange(1, 10000)
+        self.rate_spin.setValue(60)
+        batch_layout.addWidget(self.summarize_all_btn)
+        batch_layout.addWidget(QLabel("Concurrent:"))
+        batch_layout.addWidget(self.concurrency_spin)
+        batch_layout.addWidget(QLabel("Requests/min:"))
+        batch_layout.addWidget(self.rate_spin)
+        summary_layout.addLayout(batch_layout)
+        
+        batch_progress_layout = QHBoxLayout()
+        self.batch_label = QLabel()
+        self.batch_progress = QProgressBar()
+        self.cancel_batch_btn = QPushButton("Cancel")
+        self.cancel_batch_btn.clicked.connect(self.cancel_batch)
+        batch_progress_layout.addWidget(self.batch_label)
+        batch_progress_layout.addWidget(self.batch_progress)
+        batch_progress_layout.addWidget(self.cancel_batch_btn)
+        summary_layout.addLayout(batch_progress_layout)
+        self.set_batch_visible(False)
         summary_widget.setLayout(summary_layout)
         
         splitter.addWidget(self.doc_preview)
@@ -132,6 +226,9 @@ class POWParserApp(QMainWindow):
         
         # Buttons for encounter builder
         btn_layout = QHBoxLayout()
+        self.build_timeline_btn = QPushButton("Build Timeline")
+        self.build_timeline_btn.clicked.connect(self.build_timeline)
+        btn_layout.addWidget(self.build_timeline_btn)
         self.save_encounter_btn = QPushButton("Save Encounter")
         self.save_encounter_btn.clicked.connect(self.save_encounter)
         self.clear_encounter_btn = QPushButton("Clear")
@@ -139,14 +236,79 @@ class POWParserApp(QMainWindow):
         btn_layout.addWidget(self.save_encounter_btn)
         btn_layout.addWidget(self.clear_encounter_btn)
         
+        self.timeline_label = QLabel()
         encounter_layout.addWidget(QLabel("Encounter Builder:"))
         encounter_layout.addWidget(self.encounter_text)
+        encounter_layout.addWidget(self.timeline_label)
         encounter_layout.addLayout(btn_layout)
         encounter_widget.setLayout(encounter_layout)
         
+        # Tab 3: Structured fields
+        fields_widget = QWidget()
+        fields_layout = QVBoxLayout()
+        self.fields_table = QTableWidget(0, len(FIELDS) + 1)
+        self.fields_table.setHorizontalHeaderLabels(
+            ["Document"] + [name.capitalize() for name in FIELDS])
+        self.fields_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        fields_btn_layout = QHBoxLayout()
+        self.extract_fields_btn = QPushButton("Extract Fields")
+        self.extract_fields_btn.clicked.connect(self.extract_all_fields)
+        self.cancel_fields_btn = QPushButton("Cancel")
+        self.cancel_fields_btn.clicked.connect(self.cancel_fields)
+        self.cancel_fields_btn.setEnabled(False)
+        self.export_json_btn = QPushButton("Export JSON")
+        self.export_json_btn.clicked.connect(lambda: self.export_fields("json"))
+        self.export_csv_btn = QPushButton("Export CSV")
+        self.export_csv_btn.clicked.connect(lambda: self.export_fields("csv"))
+        fields_btn_layout.addWidget(self.extract_fields_btn)
+        fields_btn_layout.addWidget(self.cancel_fields_btn)
+        fields_btn_layout.addWidget(self.export_json_btn)
+        fields_btn_layout.addWidget(self.export_csv_btn)
+        
+        fields_layout.addWidget(QLabel("Structured Fields (LLM is used only for fields the rules miss, when an API key is set):"))
+        fields_layout.addWidget(self.fields_table)
+        fields_layout.addLayout(fields_btn_layout)
+        fields_widget.setLayout(fields_layout)
+        
+        # Tab 4: Diagnostics (timers and counters from instrumentation.py)
+        diagnostics_widget = QWidget()
+        diagnostics_layout = QVBoxLayout()
+        self.diagnostics_table = QTableWidget(0, 5)
+        self.diagnostics_table.setHorizontalHeaderLabels(
+            ["Name", "Count", "Total (s)", "Mean (ms)", "Max (ms)"])
+        self.diagnostics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        diagnostics_btn_layout = QHBoxLayout()
+        self.trace_btn = QPushButton("Record Trace")
+        self.trace_btn.setCheckable(True)
+        self.trace_btn.setChecked(instrumentation.tracing)
+        self.trace_btn.toggled.connect(self.toggle_trace)
+        self.export_trace_btn = QPushButton("Export Trace...")
+        self.export_trace_btn.clicked.connect(self.export_trace)
+        self.reset_diagnostics_btn = QPushButton("Reset")
+        self.reset_diagnostics_btn.clicked.connect(instrumentation.reset)
+        diagnostics_btn_layout.addWidget(self.trace_btn)
+        diagnostics_btn_layout.addWidget(self.export_trace_btn)
+        diagnostics_btn_layout.addWidget(self.reset_diagnostics_btn)
+        
+        diagnostics_layout.addWidget(self.diagnostics_table)
+        diagnostics_layout.addLayout(diagnostics_btn_layout)
+        diagnostics_widget.setLayout(diagnostics_layout)
+        
         # Add tabs
         self.tabs.addTab(doc_viewer_widget, "Document Viewer")
         self.tabs.addTab(encounter_widget, "Encounter Builder")
+        self.tabs.addTab(fields_widget, "Structured Fields")
+        self.tabs.addTab(diagnostics_widget, "Diagnostics")
+        
+        # Key numbers stay visible in the status bar
+        self.diagnostics_label = QLabel()
+        self.statusBar().addPermanentWidget(self.diagnostics_label)
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(1000)
+        self.diagnostics_timer.timeout.connect(self.refresh_diagnostics)
+        self.diagnostics_timer.start()
         
         # Add panels to main layout
         main_layout.addWidget(left_panel, 1)
@@ -161,17 +323,177 @@ class POWParserApp(QMainWindow):
             self, "Select Medical Documents", "", "PDF Files (*.pdf)"
         )
         
-        for file_path in files:
-            doc = MedicalDocument(file_path)
-            self.documents[doc.filename] = doc
-            self.doc_list.addItem(doc.filename)
+        if not files:
+            return
+        self.start_ingestion(files)
+    
+    def start_ingestion(self, paths):
+        """Open PDFs in the background; paths that arrive meanwhile wait for the next batch"""
+        if self.ingestion is not None:
+            self.pending_paths.extend(paths)
+            return
+        
+        # Extract in the background so the window stays responsive
+        self.upload_btn.setEnabled(False)
+        self.ingest_progress.setRange(0, len(paths))
+        self.ingest_progress.setValue(0)
+        self.ingest_label.setText(f"Opening {len(paths)} document(s)...")
+        self.set_ingestion_visible(True)
+        
+        self.ingestion = IngestionWorker(paths)
+        self.ingestion.document_ready.connect(self.add_document)
+        self.ingestion.document_failed.connect(self.report_ingestion_error)
+        self.ingestion.progress.connect(self.update_ingestion_progress)
+        self.ingestion.finished.connect(self.ingestion_finished)
+        self.ingestion.start()
     
+    def add_document(self, path, content_hash, page_count):
+        """Add a document opened by the ingestion worker; unchanged files and copies are skipped"""
+        # The document loaded from this path before, if the file has changed since
+        previous = self.documents.get(self.paths.get(path))
+        if previous is not None and (previous.path != path or previous.content_hash == content_hash):
+            previous = None
+        self.paths[path] = content_hash
+        summarize = path in self.auto_summary_paths
+        self.auto_summary_paths.discard(path)
+        if content_hash in self.documents:
+            # Already loaded from elsewhere; an old version of this file is dropped
+            if previous is not None:
+                self.remove_document(previous)
+            return
+        
+        doc = MedicalDocument(path, page_count, content_hash)
+        if previous is not None:
+            # The new version takes the list entry of the old one
+            self.replace_document(previous, doc)
+        else:
+            self.insert_document(doc)
+        self.index_worker.add(doc)
+        if summarize:
+            self.auto_summary_queue.append(content_hash)
+    
+    def insert_document(self, doc):
+        """Add a document to the list and return its list item"""
+        item = QListWidgetItem(doc.filename)
+        item.setData(Qt.UserRole, doc.content_hash)
+        item.setToolTip(doc.path)
+        self.doc_list.addItem(item)
+        self.documents[doc.content_hash] = doc
+        self.list_items[doc.content_hash] = item
+        return item
+    
+    def drop_document(self, doc):
+        """Forget a document and its fields row; returns its list item for the caller to reuse or remove"""
+        del self.documents[doc.content_hash]
+        doc.close()
+        self.search_index.discard(doc.content_hash)
+        field_item = self.field_items.pop(doc.content_hash, None)
+        if field_item is not None:
+            self.fields_table.removeRow(field_item.row())
+        return self.list_items.pop(doc.content_hash)
+    
+    def remove_document(self, doc):
+        """Remove a document from the list, showing the next one if it was displayed"""
+        item = self.drop_document(doc)
+        was_current = self.doc_list.currentItem() is item
+        self.doc_list.takeItem(self.doc_list.row(item))
+        current = self.doc_list.currentItem()
+        if was_current and current is not None:
+            self.display_document(current)
+    
+    def replace_document(self, old, doc):
+        """Show doc in the list entry of old, a previous version of the same file"""
+        item = self.drop_document(old)
+        item.setData(Qt.UserRole, doc.content_hash)
+        self.documents[doc.content_hash] = doc
+        self.list_items[doc.content_hash] = item
+        if self.doc_list.currentItem() is item:
+            self.display_document(item)
+    
+    def current_document(self):
+        """The document selected in the list, or None"""
+        item = self.doc_list.currentItem()
+        return item and self.documents.get(item.data(Qt.UserRole))
+    
+    def report_ingestion_error(self, path, error):
+        """Log a document that could not be opened"""
+        print(f"Error opening {path}: {error}")
+    
+    def update_ingestion_progress(self, done, total, filename):
+        """Show per-file ingestion progress"""
+        self.ingest_progress.setValue(done)
+        self.ingest_label.setText(f"Opened {done}/{total}: {filename}")
+    
+    def cancel_ingestion(self):
+        """Stop the running ingestion and drop queued files; documents already added are kept"""
+        self.pending_paths = []
+        if self.ingestion is not None:
+            self.ingestion.cancel()
+            self.cancel_ingest_btn.setEnabled(False)
+            self.ingest_label.setText("Cancelling...")
+    
+    def ingestion_finished(self):
+        """Reset the ingestion controls once the worker has stopped"""
+        self.ingestion = None
+        self.set_ingestion_visible(False)
+        self.upload_btn.setEnabled(True)
+        if self.pending_paths:
+            paths = list(dict.fromkeys(self.pending_paths))
+            self.pending_paths = []
+            self.start_ingestion(paths)
+        self.summarize_watched()
+    
+    def watch_folder(self):
+        """Add an intake folder whose new and changed PDFs are loaded automatically"""
+        directory = QFileDialog.getExistingDirectory(self, "Select Folder to Watch")
+        if not directory:
+            return
+        self.folder_watcher.add_directory(directory)
+        self.stop_watch_btn.setEnabled(True)
+        self.watch_label.setText("Watching: " + ", ".join(self.folder_watcher.directories))
+        self.watch_label.setVisible(True)
+    
+    def stop_watching(self):
+        """Stop watching every folder; loaded documents are kept"""
+        self.folder_watcher.clear()
+        self.stop_watch_btn.setEnabled(False)
+        self.watch_label.setVisible(False)
+    
+    def ingest_watched_files(self, paths):
+        """Load a debounced batch of new or modified PDFs from a watched folder"""
+        if self.auto_summary_check.isChecked():
+            self.auto_summary_paths.update(paths)
+        self.statusBar().showMessage(f"{len(paths)} new or changed document(s) in watched folder", 5000)
+        self.start_ingestion(paths)
+    
+    def summarize_watched(self):
+        """Summarize the documents the watcher brought in, one batch at a time"""
+        if self.batch is not None or not self.auto_summary_queue:
+            return
+        pending = [self.documents[key] for key in self.auto_summary_queue
+                   if key in self.documents and not self.documents[key].summary]
+        self.auto_summary_queue = []
+        self.api_key = self.api_key_edit.toPlainText().strip()
+        if not pending or not self.api_key:
+            return
+        self.start_batch(pending)
+    
+    def set_ingestion_visible(self, visible):
+        """Show or hide the ingestion progress controls"""
+        self.ingest_label.setVisible(visible)
+        self.ingest_progress.setVisible(visible)
+        self.cancel_ingest_btn.setVisible(visible)
+        self.cancel_ingest_btn.setEnabled(visible)
+    
+    @timed("ui.display_document")
     def display_document(self, item):
         """Display the selected document in the preview area"""
-        filename = item.text()
-        if filename in self.documents:
-            doc = self.documents[filename]
-            self.doc_preview.setText(doc.text_content[:10000] + "...")  # Limit display for performance
+        doc = self.documents.get(item.data(Qt.UserRole))
+        if doc is not None:
+            # Only the pages on screen are extracted
+            self.doc_preview.set_document(doc)
+            self.stream_buffer = []
+            self.stream_hash = None
             
             # Display existing summary if available
             if doc.summary:
@@ -179,14 +501,31 @@ class POWParserApp(QMainWindow):
             else:
                 self.summary_text.clear()
     
+    def ocr_page_ready(self, path, number):
+        """Show OCR text as soon as it arrives if the page is on screen"""
+        doc = self.current_document()
+        if doc and doc.path == path:
+            self.doc_preview.refresh_page(number)
+        self.statusBar().showMessage(f"OCR finished for page {number + 1} of {os.path.basename(path)}", 3000)
+        self.ocr_page_done(path)
+    
+    def ocr_page_failed(self, path, number, error):
+        """Report a page that could not be OCR'd"""
+        print(f"Error running OCR on page {number + 1} of {path}: {error}")
+        self.statusBar().showMessage(f"OCR failed for page {number + 1} of {os.path.basename(path)}", 5000)
+        self.ocr_page_done(path)
+    
+    def ocr_page_done(self, path):
+        """Re-index a document once the last of its queued OCR pages is done"""
+        doc = self.documents.get(self.paths.get(path))
+        if doc is not None and doc.path == path and not doc.pending_ocr:
+            # It was indexed while its scanned pages were still blank
+            self.index_worker.add(doc, replace=True)
+    
     def generate_summary(self):
         """Generate summary for the selected document using LLM"""
-        current_item = self.doc_list.currentItem()
-        if not current_item:
-            return
-            
-        filename = current_item.text()
-        if filename not in self.documents:
+        doc = self.current_document()
+        if doc is None:
             return
             
         # Get API key
@@ -199,23 +538,362 @@ class POWParserApp(QMainWindow):
         self.generate_btn.setEnabled(False)
         self.summary_text.setText("Generating summary...")
         
-        # Start thread
-        self.summarizer = LLMSummarizer(self.documents[filename], self.api_key)
-        self.summarizer.summary_ready.connect(self.update_summary)
-        self.summarizer.start()
+        # Keep a reference until the job finishes so it is never orphaned
+        from llm_jobs import LLMSummarizer
+        summarizer = LLMSummarizer(doc, self.get_llm_client(), self.llm_loop)
+        summarizer.summary_ready.connect(self.update_summary)
+        summarizer.summary_failed.connect(self.report_summary_error)
+        summarizer.summary_chunk.connect(self.append_summary_chunk)
+        summarizer.usage_report.connect(self.report_token_usage)
+        summarizer.finished.connect(lambda: self.summarizers.discard(summarizer))
+        self.summarizers.add(summarizer)
+        summarizer.start()
+    
+    def summarize_all(self):
+        """Summarize every loaded document that does not have a summary yet"""
+        self.api_key = self.api_key_edit.toPlainText().strip()
+        if not self.api_key:
+            self.summary_text.setText("Please enter an OpenAI API key.")
+            return
+        
+        pending = [doc for doc in self.documents.values() if not doc.summary]
+        if not pending or self.batch is not None:
+            return
+        self.start_batch(pending)
+    
+    def start_batch(self, pending):
+        """Summarize the given documents concurrently with progress in the batch panel"""
+        self.summarize_all_btn.setEnabled(False)
+        self.batch_progress.setRange(0, len(pending))
+        self.batch_progress.setValue(0)
+        self.batch_label.setText(f"0/{len(pending)}")
+        self.set_batch_visible(True)
+        
+        client = self.get_llm_client()
+        from llm import TokenBucket
+        from llm_jobs import BatchSummarizer
+        client.rate_limiter = TokenBucket(self.rate_spin.value() / 60.0)
+        self.batch = BatchSummarizer(pending, client, self.llm_loop,
+                                     concurrency=self.concurrency_spin.value())
+        self.batch.summary_ready.connect(self.update_summary)
+        self.batch.summary_failed.connect(self.report_summary_error)
+        self.batch.usage_report.connect(self.report_token_usage)
+        self.batch.progress.connect(self.update_batch_progress)
+        self.batch.finished.connect(self.batch_finished)
+        self.batch.start()
     
-    def update_summary(self, filename, summary):
+    def extract_all_fields(self):
+        """Extract structured fields for every loaded document"""
+        if not self.documents or self.field_extractor is not None:
+            return
+        self.api_key = self.api_key_edit.toPlainText().strip()
+        client = self.get_llm_client() if self.api_key else None
+        self.extract_fields_btn.setEnabled(False)
+        self.cancel_fields_btn.setEnabled(True)
+        from llm_jobs import FieldExtractor
+        self.field_extractor = FieldExtractor(self.documents.values(), client,
+                                              self.get_llm_loop())
+        self.field_extractor.record_ready.connect(self.show_fields)
+        self.field_extractor.finished.connect(self.fields_finished)
+        self.field_extractor.start()
+    
+    @timed("ui.show_fields")
+    def show_fields(self, content_hash):
+        """Add or update the table row of a document"""
+        doc = self.documents.get(content_hash)
+        if doc is None or doc.fields is None:
+            return
+        name_item = self.field_items.get(content_hash)
+        if name_item is None:
+            row = self.fields_table.rowCount()
+            self.fields_table.insertRow(row)
+            name_item = QTableWidgetItem(doc.filename)
+            name_item.setToolTip(doc.path)
+            self.fields_table.setItem(row, 0, name_item)
+            self.field_items[content_hash] = name_item
+        row = name_item.row()
+        for column, name in enumerate(FIELDS, start=1):
+            value = getattr(doc.fields, name)
+            text = "; ".join(value) if isinstance(value, list) else (value or "")
+            item = QTableWidgetItem(text)
+            if name in doc.fields.sources:
+                item.setToolTip(f"from {doc.fields.sources[name]}")
+            self.fields_table.setItem(row, column, item)
+    
+    def cancel_fields(self):
+        """Stop the running field extraction; records already extracted are kept"""
+        if self.field_extractor is not None:
+            self.field_extractor.cancel()
+            self.cancel_fields_btn.setEnabled(False)
+    
+    def fields_finished(self):
+        self.field_extractor = None
+        self.extract_fields_btn.setEnabled(True)
+        self.cancel_fields_btn.setEnabled(False)
+    
+    def export_fields(self, kind):
+        """Save the extracted fields as JSON or CSV"""
+        # Full paths, since file names alone are not unique
+        records = {doc.path: doc.fields for doc in self.documents.values() if doc.fields}
+        if not records:
+            return
+        pattern = "JSON Files (*.json)" if kind == "json" else "CSV Files (*.csv)"
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Fields", "", pattern)
+        if file_path:
+            try:
+                with open(file_path, "w", newline="") as file:
+                    if kind == "json":
+                        records_to_json(records, file)
+                    else:
+                        records_to_csv(records, file)
+            except Exception as e:
+                print(f"Error exporting fields: {e}")
+    
+    def update_index_status(self, content_hash):
+        """Show how many documents are searchable"""
+        self.index_label.setText(f"{len(self.search_index)} document(s) indexed")
+    
+    def run_search(self):
+        """Search the index and list matching pages"""
+        query = self.search_edit.text().strip()
+        self.search_results.clear()
+        if not query:
+            self.search_results.setVisible(False)
+            return
+        
+        terms = tokenize(query)
+        for hit in self.search_index.search(query):
+            doc = self.documents.get(hit.content_hash)
+            if doc is None:
+                continue  # indexed in an earlier session but not loaded now
+            snippet = self.search_snippet(doc.page_text(hit.page), terms)
+            item = QListWidgetItem(f"{doc.filename} p.{hit.page + 1}: {snippet}")
+            item.setData(Qt.UserRole, (doc.content_hash, hit.page))
+            self.search_results.addItem(item)
+        if not self.search_results.count():
+            self.search_results.addItem("No matches")
+        self.search_results.setVisible(True)
+    
+    def search_snippet(self, text, terms, width=60):
+        """Short excerpt of text around the first query term"""
+        lowered = text.lower()
+        start = min((i for i in (lowered.find(term) for term in terms) if i >= 0), default=0)
+        start = max(0, start - width // 2)
+        return " ".join(text[start:start + width].split())
+    
+    def open_search_result(self, item):
+        """Show the document and page of a search hit"""
+        data = item.data(Qt.UserRole)
+        if not data:
+            return
+        content_hash, page = data
+        list_item = self.list_items.get(content_hash)
+        if list_item is not None:
+            self.doc_list.setCurrentItem(list_item)
+            self.display_document(list_item)
+            self.doc_preview.go_to_page(page)
+    
+    def get_llm_loop(self):
+        """Event loop thread shared by all LLM work, started on first use"""
+        if self.llm_loop is None:
+            from llm_jobs import AsyncLoopThread
+            self.llm_loop = AsyncLoopThread()
+            self.llm_loop.start()
+        return self.llm_loop
+    
+    def preload_llm_stack(self):
+        """Import the LLM and PDF modules in the background once the window is up"""
+        def preload():
+            try:
+                import fitz  # noqa: F401
+                import aiohttp  # noqa: F401
+                import llm_jobs  # noqa: F401
+            except Exception as e:
+                print(f"Error preloading modules: {e}")
+        threading.Thread(target=preload, daemon=True).start()
+    
+    def get_llm_client(self):
+        """Shared async LLM client for the current API key (starts the LLM loop)"""
+        from llm import TokenBucket
+        from llm_client import AsyncLLMClient
+        self.get_llm_loop()
+        if self.llm_client is None or self.llm_client.api_key != self.api_key:
+            if self.llm_client is not None:
+                self.llm_loop.submit(self.llm_client.close())
+            self.llm_client = AsyncLLMClient(
+                self.api_key, rate_limiter=TokenBucket(self.rate_spin.value() / 60.0))
+        return self.llm_client
+    
+    def update_batch_progress(self, done, total):
+        """Show how many documents the batch has summarized"""
+        self.batch_progress.setValue(done)
+        self.batch_label.setText(f"{done}/{total}")
+    
+    def cancel_batch(self):
+        """Stop the running batch after the requests in flight"""
+        if self.batch is not None:
+            self.batch.cancel()
+            self.cancel_batch_btn.setEnabled(False)
+            self.batch_label.setText("Cancelling...")
+    
+    def batch_finished(self):
+        """Reset the batch controls once the batch has stopped"""
+        usage = self.batch.usage
+        self.batch = None
+        if self.llm_client is not None:
+            stats = self.llm_client.metrics.snapshot()
+            self.statusBar().showMessage(
+                f"{stats['requests']} requests, {stats['retries']} retries, "
+                f"latency p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s; {usage.describe()}")
+        self.set_batch_visible(False)
+        self.summarize_all_btn.setEnabled(True)
+        self.summarize_watched()
+    
+    def set_batch_visible(self, visible):
+        """Show or hide the batch progress controls"""
+        self.batch_label.setVisible(visible)
+        self.batch_progress.setVisible(visible)
+        self.cancel_batch_btn.setVisible(visible)
+        self.cancel_batch_btn.setEnabled(visible)
+    
+    def append_summary_chunk(self, content_hash, text):
+        """Queue streamed summary text for the currently displayed document"""
+        doc = self.current_document()
+        if doc is None or doc.content_hash != content_hash:
+            return
+        if self.stream_hash != content_hash:
+            # First fragment replaces the "Generating summary..." placeholder
+            self.stream_hash = content_hash
+            self.stream_buffer = []
+            self.summary_text.clear()
+        self.stream_buffer.append(text)
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+    
+    @timed("ui.summary_flush")
+    def flush_summary_stream(self):
+        """Append buffered fragments in one edit so the widget is laid out once per flush"""
+        self.stream_timer.stop()
+        if not self.stream_buffer:
+            return
+        cursor = self.summary_text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText("".join(self.stream_buffer))
+        self.stream_buffer = []
+    
+    def report_token_usage(self, content_hash, description):
+        """Show the token usage of a finished summary"""
+        doc = self.documents.get(content_hash)
+        filename = doc.filename if doc else content_hash[:12]
+        self.statusBar().showMessage(f"{filename}: {description}", 10000)
+    
+    @timed("ui.update_summary")
+    def update_summary(self, content_hash, summary, from_cache=False):
         """Update the summary text when the LLM returns a result"""
-        if filename in self.documents:
-            self.documents[filename].summary = summary
+        if self.stream_hash == content_hash:
+            self.stream_timer.stop()
+            self.stream_buffer = []
+            self.stream_hash = None
+        # summarize_document has stored the summary on the document if it is complete
+        doc = self.documents.get(content_hash)
+        if doc is not None:
+            if doc.pending_ocr:
+                self.statusBar().showMessage(
+                    f"Summary for {doc.filename} is incomplete; scanned pages are still in the OCR queue", 5000)
+            elif from_cache:
+                self.statusBar().showMessage(f"Summary for {doc.filename} loaded from cache", 5000)
             
         # Update UI if this is the currently displayed document
-        current_item = self.doc_list.currentItem()
-        if current_item and current_item.text() == filename:
+        if doc is not None and doc is self.current_document():
             self.summary_text.setText(summary)
             
         self.generate_btn.setEnabled(True)
     
+    def report_summary_error(self, content_hash, error):
+        """Show a failed summary; the document keeps no summary so it can be retried"""
+        if self.stream_hash == content_hash:
+            self.stream_timer.stop()
+            self.stream_buffer = []
+            self.stream_hash = None
+        doc = self.documents.get(content_hash)
+        filename = doc.filename if doc else content_hash[:12]
+        print(f"Error generating summary for {filename}: {error}")
+        if doc is not None and doc is self.current_document():
+            self.summary_text.setText(f"Error generating summary: {error}")
+        self.statusBar().showMessage(f"Summary for {filename} failed", 5000)
+        self.generate_btn.setEnabled(True)
+    
+    def refresh_diagnostics(self):
+        """Update the status bar figures and, when it is shown, the diagnostics table"""
+        snapshot = instrumentation.snapshot()
+        timers = snapshot["timers"]
+        counters = snapshot["counters"]
+        
+        parts = [f"pages extracted {counters.get('page.extracted', 0)}"]
+        for name, label in (("page.extract", "extract"), ("llm.request", "API"),
+                            ("llm.stream", "stream")):
+            if name in timers:
+                parts.append(f"{label} {timers[name]['mean'] * 1000:.0f} ms")
+        self.diagnostics_label.setText(" | ".join(parts))
+        
+        if self.tabs.currentWidget() is not self.diagnostics_table.parentWidget():
+            return
+        rows = [(name, stats["count"], f"{stats['total']:.3f}", f"{stats['mean'] * 1000:.2f}",
+                 f"{stats['max'] * 1000:.2f}") for name, stats in sorted(timers.items())]
+        rows += [(name, value, "", "", "") for name, value in sorted(counters.items())]
+        self.diagnostics_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.diagnostics_table.setItem(row, column, QTableWidgetItem(str(value)))
+    
+    def toggle_trace(self, enabled):
+        """Start or stop keeping individual trace events"""
+        if enabled:
+            instrumentation.start_trace()
+        else:
+            instrumentation.stop_trace()
+    
+    def export_trace(self):
+        """Save the recorded events as a Chrome trace"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Trace", "pow_parser_trace.json", "Trace Files (*.json)")
+        if file_path:
+            try:
+                events = instrumentation.export_chrome_trace(file_path)
+                self.statusBar().showMessage(f"Exported {events} trace events to {file_path}", 5000)
+            except Exception as e:
+                print(f"Error exporting trace: {e}")
+    
+    def build_timeline(self):
+        """Group all documents into a deduplicated encounter timeline (summarized when an API key is set)"""
+        if not self.documents or self.aggregator is not None:
+            return
+        self.api_key = self.api_key_edit.toPlainText().strip()
+        client = self.get_llm_client() if self.api_key else None
+        self.build_timeline_btn.setEnabled(False)
+        self.timeline_label.setText("Grouping pages by patient and date...")
+        from llm_jobs import EncounterAggregator
+        self.aggregator = EncounterAggregator(self.documents.values(), client, self.get_llm_loop(),
+                                              concurrency=self.concurrency_spin.value())
+        self.aggregator.timeline_ready.connect(self.show_timeline)
+        self.aggregator.progress.connect(
+            lambda done, total: self.timeline_label.setText(f"Summarized {done}/{total} encounter(s)..."))
+        self.aggregator.finished.connect(self.timeline_finished)
+        self.aggregator.start()
+    
+    def show_timeline(self, text, description):
+        """Put the encounter timeline into the Encounter Builder"""
+        if text:
+            self.encounter_text.setPlainText(text)
+        self.timeline_label.setText(description)
+    
+    def timeline_finished(self):
+        usage = self.aggregator.usage
+        self.aggregator = None
+        self.build_timeline_btn.setEnabled(True)
+        if usage.requests:
+            self.statusBar().showMessage(f"Encounter timeline: {usage.describe()}", 10000)
+    
     def save_encounter(self):
         """Save the current encounter text to a file"""
         encounter_text = self.encounter_text.toPlainText()
@@ -233,12 +911,132 @@ class POWParserApp(QMainWindow):
             except Exception as e:
                 print(f"Error saving encounter: {e}")
     
+    def save_session(self):
+        """Save the documents, page text, summaries, fields and encounter text to a session file"""
+        if not self.documents or self.session_saver is not None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Session", "", "P.O.W. Sessions (*.powsession)")
+        if not file_path:
+            return
+        self.save_session_btn.setEnabled(False)
+        # Pages are read from the extraction cache (or extracted) in the background
+        self.session_saver = SessionSaver(file_path, self.documents.values(),
+                                          self.encounter_text.toPlainText())
+        self.session_saver.progress.connect(
+            lambda done, total: self.statusBar().showMessage(f"Saving session: {done}/{total} document(s)"))
+        self.session_saver.saved.connect(self.session_saved)
+        self.session_saver.failed.connect(self.session_save_failed)
+        self.session_saver.finished.connect(self.session_save_finished)
+        self.session_saver.start()
+    
+    def session_saved(self, path, size):
+        self.statusBar().showMessage(
+            f"Saved {len(self.session_saver.documents)} document(s) to {path} ({size / 1e6:.1f} MB)", 10000)
+    
+    def session_save_failed(self, path, error):
+        print(f"Error saving session {path}: {error}")
+        self.statusBar().showMessage(f"Could not save session: {error}", 10000)
+    
+    def session_save_finished(self):
+        self.session_saver = None
+        self.save_session_btn.setEnabled(True)
+    
+    def open_session(self):
+        """Load the documents of a session file; page text is read from it as pages are shown"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Session", "", "P.O.W. Sessions (*.powsession)")
+        if file_path:
+            self.load_session(file_path)
+    
+    def load_session(self, path):
+        """Add the documents and encounter text of a session file"""
+        try:
+            reader = SessionReader(path)
+        except Exception as e:
+            print(f"Error opening session {path}: {e}")
+            self.statusBar().showMessage(f"Could not open session: {e}", 10000)
+            return
+        self.sessions.append(reader)
+        
+        added = 0
+        for number, entry in enumerate(reader.documents):
+            content_hash = entry["content_hash"]
+            self.paths[entry["path"]] = content_hash
+            if content_hash in self.documents:
+                continue
+            doc = MedicalDocument(entry["path"], entry["page_count"], content_hash)
+            doc.page_source = functools.partial(reader.page_text, number)
+            doc.summary = entry["summary"] or doc.summary
+            if entry["fields"]:
+                doc.fields = EncounterRecord(**entry["fields"])
+            self.insert_document(doc)
+            if doc.fields:
+                self.show_fields(content_hash)
+            self.index_worker.add(doc)
+            added += 1
+        
+        if reader.encounter_text and not self.encounter_text.toPlainText().strip():
+            self.encounter_text.setPlainText(reader.encounter_text)
+        self.statusBar().showMessage(f"Opened {added} document(s) from {path}", 10000)
+    
     def clear_encounter(self):
         """Clear the encounter builder text area"""
         self.encounter_text.clear()
+    
+    def closeEvent(self, event):
+        """Cancel outstanding work and stop the worker threads and the LLM event loop"""
+        if self.batch is not None:
+            self.batch.cancel()
+        if self.field_extractor is not None:
+            self.field_extractor.cancel()
+        if self.aggregator is not None:
+            self.aggregator.future.cancel()
+        for summarizer in self.summarizers:
+            summarizer.future.cancel()
+        if self.llm_client is not None:
+            self.llm_loop.submit(self.llm_client.close()).result(timeout=5)
+        if self.llm_loop is not None:
+            self.llm_loop.stop()
+        self.folder_watcher.clear()
+        if self.ingestion is not None:
+            # Files already being opened finish; the rest of the batch is dropped
+            self.ingestion.cancel()
+            self.ingestion.wait()
+        self.index_worker.stop()
+        document.ocr_handler = None
+        self.ocr_worker.stop()
+        self.search_index.close()
+        if self.session_saver is not None:
+            self.session_saver.wait()
+        for reader in self.sessions:
+            reader.close()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="P.O.W. Parser")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record the session and write a Chrome trace to FILE on exit")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run the session (GUI thread) under cProfile and save stats to FILE")
+    args, qt_args = parser.parse_known_args()
+    if args.trace:
+        instrumentation.start_trace()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
     window = POWParserApp()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    # Load the rest once the first frame is painted
+    QTimer.singleShot(0, window.preload_llm_stack)
+    status = app.exec_()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile saved to {args.profile} (view with python -m pstats {args.profile})")
+    if args.trace:
+        print(f"Wrote {instrumentation.export_chrome_trace(args.trace)} trace events to {args.trace}")
+    sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+A local stand-in for the OpenAI chat completion API.
+
+Useful for exercising the summarization code offline and for load testing:
+
+    python mock_openai_server.py --port 8001 --latency 0.5
+    OPENAI_API_BASE=http://127.0.0.1:8001/v1 python main.py
+
+Replies are deterministic: the last few words of the last user message.
+Requests with "stream": true are answered with server-sent events, one word
+per chunk, followed by a usage chunk when stream_options.include_usage is set.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    """Handles POST /v1/chat/completions"""
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_every and count % server.fail_every == 0:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+            return
+
+        messages = request.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        words = prompt.split()
+        reply = "Summary: " + " ".join(words[-server.reply_words:])
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply) // 4,
+            "total_tokens": prompt_tokens + len(reply) // 4,
+        }
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            self._send_stream(count, request.get("model", "mock"), reply,
+                              usage if include_usage else None)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _send_stream(self, count, model, reply, usage=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, word in enumerate(reply.split(" ")):
+            chunk = {
+                "id": f"chatcmpl-mock-{count}",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                             "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        if usage:
+            chunk = {"id": f"chatcmpl-mock-{count}", "object": "chat.completion.chunk",
+                     "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host="127.0.0.1", port=0, latency=0.0, fail_every=0, reply_words=40,
+                token_delay=0.0, verbose=False):
+    """Create a mock server; port 0 picks a free port (see server.server_address)"""
+    server = ThreadingHTTPServer((host, port), MockCompletionHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.latency = latency
+    server.fail_every = fail_every
+    server.reply_words = reply_words
+    server.token_delay = token_delay
+    server.verbose = verbose
+    return server
+
+
+def start_in_thread(**options):
+    """Start a mock server in a daemon thread and return (server, api_base)"""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completion server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to wait before each reply")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="answer every Nth request with HTTP 429")
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="seconds between streamed words")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.fail_every,
+                         token_delay=args.token_delay, verbose=args.verbose)
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+OCR for scanned, image-only pages.
+
+A page with no text layer but with images is recognized with Tesseract
+through PyMuPDF's OCR support (Tesseract and its language data must be
+installed and TESSDATA_PREFIX set). OCR is slow, so the GUI runs it in a
+separate process pool (see ingestion.OCRWorker) and results are cached by
+a hash of the page's images.
+"""
+import hashlib
+
+from extraction import layout_text
+
+OCR_LANGUAGE = "eng"
+OCR_DPI = 300
+
+
+def page_image_hash(pdf, number):
+    """SHA-256 of the raw image streams on a page, or None if it has no images"""
+    images = pdf[number].get_images(full=True)
+    if not images:
+        return None
+    digest = hashlib.sha256()
+    for image in images:
+        digest.update(pdf.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+def ocr_page(path, number, language=OCR_LANGUAGE, dpi=OCR_DPI):
+    """OCR text of one page (runs inside a worker process)"""
+    import fitz  # PyMuPDF
+    pdf = fitz.open(path)
+    try:
+        page = pdf[number]
+        textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True)
+        return layout_text(page, textpage=textpage)
+    finally:
+        pdf.close()
+
+
+def ocr_now(document, number, image_hash):
+    """OCR a page in this process and store the text (an ocr_handler for batch runs)"""
+    from cache import get_cache
+    try:
+        text = ocr_page(document.path, number)
+    except Exception as e:
+        print(f"Error running OCR on page {number + 1} of {document.path}: {e}")
+        return
+    cache = get_cache()
+    if cache:
+        cache.put_ocr(image_hash, text)
+    document.set_page_text(number, text)
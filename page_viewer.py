@@ -0,0 +1,180 @@
+"""
+Virtualized, paged document viewer.
+
+Only a small window of pages around the visible one is ever placed in the
+QTextEdit. As the user scrolls towards either end of the window, it is
+re-rendered around the new position with the scroll offset preserved, and
+the neighbouring pages are prefetched in the background. Memory and frame
+time therefore stay constant whether a document has 2 or 2,000 pages.
+"""
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QTextEdit
+from PyQt5.QtCore import QPoint, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+
+from instrumentation import span
+
+# Page extraction for prefetching happens off the GUI thread
+_prefetcher = ThreadPoolExecutor(max_workers=1)
+
+
+class PagedDocumentView(QWidget):
+    """Read-only viewer that renders only the pages around the visible one"""
+    page_changed = pyqtSignal(int)  # zero-based page at the top of the view
+
+    PAGES_BEFORE = 2       # pages kept above the visible page
+    PAGES_AFTER = 3        # minimum pages rendered below it...
+    MIN_CHARS_AFTER = 8000  # ...and minimum characters, so short pages still fill the view
+    MAX_PAGES = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.page_count = 0
+        self.get_page = None
+        self._first = 0        # first rendered page
+        self._offsets = []     # character offset of each rendered page
+        self._rendering = False
+
+        self.text_edit = QTextEdit()
+        self.text_edit.setReadOnly(True)
+        self.text_edit.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+        self.page_spin = QSpinBox()
+        self.page_spin.setMinimum(1)
+        self.page_spin.setMaximum(1)
+        self.page_spin.valueChanged.connect(lambda value: self.go_to_page(value - 1))
+        self.page_total = QLabel("of 0")
+
+        nav_layout = QHBoxLayout()
+        nav_layout.addStretch()
+        nav_layout.addWidget(QLabel("Page"))
+        nav_layout.addWidget(self.page_spin)
+        nav_layout.addWidget(self.page_total)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.text_edit)
+        layout.addLayout(nav_layout)
+        self.setLayout(layout)
+
+    def set_document(self, document):
+        """Show a MedicalDocument (anything with page_count and page_text)"""
+        self.set_pages(document.page_count, document.page_text)
+
+    def set_pages(self, page_count, get_page):
+        """Show page_count pages, fetching page n with get_page(n)"""
+        self.page_count = page_count
+        self.get_page = get_page
+        self.page_spin.blockSignals(True)
+        self.page_spin.setMaximum(max(1, page_count))
+        self.page_spin.setValue(1)
+        self.page_spin.blockSignals(False)
+        self.page_total.setText(f"of {page_count}")
+        self.go_to_page(0)
+
+    def clear(self):
+        self.page_count = 0
+        self.get_page = None
+        self._offsets = []
+        self.text_edit.clear()
+        self.page_total.setText("of 0")
+
+    def current_page(self):
+        """Zero-based page at the top of the view"""
+        return self._anchor()[0]
+
+    def go_to_page(self, number):
+        """Scroll so that page number is at the top"""
+        if not self.page_count:
+            self.text_edit.clear()
+            return
+        self._render(max(0, min(number, self.page_count - 1)), 0)
+
+    def refresh_page(self, number):
+        """Re-fetch a page whose text has changed, if it is on screen"""
+        if self._offsets and self._first <= number < self._first + len(self._offsets):
+            self._render(*self._anchor())
+
+    def _anchor(self):
+        """(page, character offset in page) at the top-left of the viewport"""
+        if not self._offsets:
+            return 0, 0
+        # y=0 is the boundary with the line above, so probe just below it
+        position = self.text_edit.cursorForPosition(QPoint(0, 2)).position()
+        index = max(0, bisect_right(self._offsets, position) - 1)
+        return self._first + index, position - self._offsets[index]
+
+    def _render(self, anchor_page, anchor_offset):
+        """Render the window of pages around anchor_page and keep the anchor at the top"""
+        with span("ui.render_pages", page=anchor_page):
+            self._render_window(anchor_page, anchor_offset)
+
+    def _render_window(self, anchor_page, anchor_offset):
+        first = max(0, anchor_page - self.PAGES_BEFORE)
+        parts = []
+        offsets = []
+        position = 0
+        chars_after = 0
+        number = first
+        while number < self.page_count and number - first < self.MAX_PAGES:
+            if (number > anchor_page + self.PAGES_AFTER - 1
+                    and chars_after >= self.MIN_CHARS_AFTER):
+                break
+            header = f"--- Page {number + 1} of {self.page_count} ---\n"
+            text = self.get_page(number)
+            if not text.endswith("\n"):
+                text += "\n"
+            offsets.append(position)
+            parts.append(header)
+            parts.append(text)
+            position += len(header) + len(text)
+            if number >= anchor_page:
+                chars_after += len(text)
+            number += 1
+
+        self._rendering = True
+        try:
+            self._first = first
+            self._offsets = offsets
+            self.text_edit.setPlainText("".join(parts))
+            cursor = QTextCursor(self.text_edit.document())
+            target = offsets[anchor_page - first] + anchor_offset
+            cursor.setPosition(min(target, self.text_edit.document().characterCount() - 1))
+            bar = self.text_edit.verticalScrollBar()
+            bar.setValue(bar.value() + self.text_edit.cursorRect(cursor).top())
+        finally:
+            self._rendering = False
+
+        self._update_page_spin(anchor_page)
+        self._prefetch([first - 1, number])
+
+    def _prefetch(self, numbers):
+        """Warm the page cache for pages just outside the rendered window"""
+        get_page = self.get_page
+        for number in numbers:
+            if 0 <= number < self.page_count:
+                _prefetcher.submit(get_page, number)
+
+    def _update_page_spin(self, page):
+        if self.page_spin.value() != page + 1:
+            self.page_spin.blockSignals(True)
+            self.page_spin.setValue(page + 1)
+            self.page_spin.blockSignals(False)
+            self.page_changed.emit(page)
+
+    def _on_scroll(self, value):
+        if self._rendering or not self._offsets:
+            return
+        page, offset = self._anchor()
+        self._update_page_spin(page)
+
+        # Slide the window once the visible page nears either end of it
+        last = self._first + len(self._offsets)
+        near_top = page - self._first < self.PAGES_BEFORE - 1 and self._first > 0
+        bar = self.text_edit.verticalScrollBar()
+        near_bottom = last < self.page_count and (
+            last - page <= 1 or value >= bar.maximum())
+        if near_top or near_bottom:
+            self._render(page, offset)
@@ -0,0 +1,251 @@
+"""
+Headless command line interface for the P.O.W. Parser.
+
+    python pow_parser.py batch records/ more.pdf --output results.jsonl
+    python pow_parser.py batch --file-list nightly.txt --output results.jsonl --resume
+
+The batch command extracts PDFs in a pool of worker processes and
+summarizes them concurrently over one pooled LLM connection, using the same
+MedicalDocument and summarization code as the GUI. Each finished document
+is written as one JSON line, and completed paths are recorded in a
+checkpoint file so an interrupted run can be resumed with --resume.
+Documents that failed are retried on resume, and their earlier error
+records are removed from the output, so it keeps one line per document.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import document
+from cache import file_hash, get_cache
+from document import MedicalDocument
+from fields import fill_missing_fields
+from llm import DEFAULT_MODEL, TokenBucket
+from llm_client import AsyncLLMClient, TokenUsage
+from ocr import ocr_now
+from summarization import summarize_document
+
+
+def find_pdfs(paths, file_list=None):
+    """Yield PDF paths from files, directories (walked recursively) and a file list"""
+    sources = list(paths)
+    if file_list:
+        stream = sys.stdin if file_list == "-" else open(file_list, encoding="utf-8")
+        with stream:
+            sources.extend(line.strip() for line in stream if line.strip())
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+
+def extract_for_batch(path, ocr=False):
+    """Extract every page of a PDF into the extraction cache (runs in a worker process)
+
+    Raises if the PDF cannot be opened, so the document is reported as an error.
+    """
+    if ocr:
+        document.ocr_handler = ocr_now
+    content_hash = file_hash(path)
+    cache = get_cache()
+    page_count = cache.get_page_count(content_hash) if cache else None
+    if page_count is None:
+        # MedicalDocument.page_count would report an unreadable file as empty
+        import fitz  # PyMuPDF
+        pdf = fitz.open(path)
+        try:
+            page_count = len(pdf)
+        finally:
+            pdf.close()
+        if cache:
+            cache.put_document(content_hash, page_count)
+    doc = MedicalDocument(path, page_count, content_hash)
+    text = doc.text_content
+    return doc.content_hash, doc.page_count, len(text)
+
+
+class Checkpoint:
+    """Append-only record of the paths a batch run has finished"""
+    def __init__(self, path, resume):
+        self.path = path
+        self.done = set()
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.done = {line.rstrip("\n") for line in file if line.strip()}
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def mark(self, path):
+        self.done.add(path)
+        self._file.write(path + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def drop_records(output_path, paths):
+    """Remove the records of paths, and any line cut off by an interruption, from a JSONL file"""
+    temp_path = output_path + ".tmp"
+    with open(output_path, encoding="utf-8") as source, \
+            open(temp_path, "w", encoding="utf-8") as target:
+        for line in source:
+            if not line.endswith("\n"):
+                continue
+            try:
+                path = json.loads(line).get("path")
+            except ValueError:
+                continue
+            if path not in paths:
+                target.write(line)
+    os.replace(temp_path, output_path)
+
+
+async def run_batch(paths, args, output, checkpoint):
+    """Extract and summarize paths, writing one JSON line per document"""
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(max_workers=args.workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+    client = None
+    if not args.no_summary:
+        client = AsyncLLMClient(args.api_key, model=args.model,
+                                rate_limiter=TokenBucket(args.rpm / 60.0),
+                                max_connections=args.concurrency * 4)
+    summary_slots = asyncio.Semaphore(args.concurrency)
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    total = len(paths)
+    counts = {"done": 0, "errors": 0}
+
+    async def process(path):
+        record = {"path": path}
+        start = time.perf_counter()
+        try:
+            content_hash, page_count, chars = await loop.run_in_executor(
+                pool, extract_for_batch, path, args.ocr)
+            record.update(content_hash=content_hash, page_count=page_count, chars=chars)
+            doc = MedicalDocument(path, page_count, content_hash)
+            if args.fields:
+                fields = await loop.run_in_executor(None, doc.extract_fields)
+                if client is not None and fields.missing():
+                    async with summary_slots:
+                        await fill_missing_fields(fields, doc.text_content,
+                                                  client.complete, client.model)
+                record["fields"] = fields.to_dict()
+            if client is not None:
+                usage = TokenUsage()
+                async with summary_slots:
+                    summary, from_cache = await summarize_document(doc, client, usage=usage)
+                record.update(summary=summary, from_cache=from_cache, tokens=usage.as_dict())
+            record["status"] = "ok"
+        except Exception as e:
+            record.update(status="error", error=str(e))
+            counts["errors"] += 1
+        record["seconds"] = round(time.perf_counter() - start, 3)
+
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+        if record["status"] == "ok":
+            checkpoint.mark(path)
+        counts["done"] += 1
+        print(f"[{counts['done']}/{total}] {record['status']}: {path}", file=sys.stderr)
+
+    async def consume():
+        while not queue.empty():
+            await process(queue.get_nowait())
+
+    # Enough consumers to keep every extraction worker and summary slot busy
+    consumers = args.workers + args.concurrency
+    try:
+        await asyncio.gather(*(consume() for _ in range(consumers)))
+    finally:
+        pool.shutdown(wait=False)
+        if client is not None:
+            await client.close()
+            stats = client.metrics.snapshot()
+            print(f"{stats['requests']} LLM requests, {stats['retries']} retries, "
+                  f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s", file=sys.stderr)
+            print(client.usage.describe(), file=sys.stderr)
+    return counts
+
+
+def batch_command(args):
+    """Run the batch subcommand"""
+    if not args.no_summary and not args.api_key:
+        print("Error: an OpenAI API key is required (--api-key or OPENAI_API_KEY), "
+              "or use --no-summary", file=sys.stderr)
+        return 2
+
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    checkpoint = Checkpoint(checkpoint_path, args.resume)
+    paths = []
+    seen = set()
+    for path in find_pdfs(args.paths, args.file_list):
+        if path not in checkpoint.done and path not in seen:
+            seen.add(path)
+            paths.append(path)
+    if checkpoint.done:
+        print(f"Resuming: {len(checkpoint.done)} document(s) already done", file=sys.stderr)
+    if args.resume and os.path.exists(args.output):
+        # Error records of documents about to be retried are replaced by the new results
+        drop_records(args.output, set(paths))
+
+    try:
+        with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+            counts = asyncio.run(run_batch(paths, args, output, checkpoint))
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun with --resume to continue from {checkpoint_path}",
+              file=sys.stderr)
+        return 130
+    finally:
+        checkpoint.close()
+
+    print(f"Processed {counts['done']} document(s), {counts['errors']} error(s)", file=sys.stderr)
+    return 1 if counts["errors"] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pow-parser", description="P.O.W. Parser command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="extract and summarize many PDFs to JSONL")
+    batch.add_argument("paths", nargs="*", help="PDF files or directories to walk")
+    batch.add_argument("--file-list", help="file with one PDF path per line ('-' for stdin)")
+    batch.add_argument("--output", "-o", required=True, help="JSONL results file")
+    batch.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    batch.add_argument("--resume", action="store_true",
+                       help="skip documents recorded in the checkpoint and append to OUTPUT")
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="extraction worker processes")
+    batch.add_argument("--concurrency", type=int, default=4,
+                       help="documents summarized at the same time")
+    batch.add_argument("--rpm", type=float, default=60, help="LLM requests per minute")
+    batch.add_argument("--model", default=DEFAULT_MODEL)
+    batch.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    batch.add_argument("--no-summary", action="store_true", help="extract only")
+    batch.add_argument("--ocr", action="store_true",
+                       help="OCR scanned pages with Tesseract while extracting")
+    batch.add_argument("--fields", action="store_true",
+                       help="add structured fields (rules first, LLM only for gaps)")
+    batch.set_defaults(func=batch_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -7,22 +7,22 @@ before running the full application.
 """
 import os
 import sys
-import fitz  # PyMuPDF
-import openai
+
+from extraction import extract_pdf
+from llm import DEFAULT_MODEL, SYSTEM_PROMPT
+from tokens import compact_text, count_tokens, prompt_budget, split_tokens
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file"""
     try:
         print(f"Opening PDF: {pdf_path}")
-        doc = fitz.open(pdf_path)
-        
-        text = ""
-        for i, page in enumerate(doc):
-            print(f"Processing page {i+1}/{len(doc)}")
-            text += page.get_text()
+        result = extract_pdf(
+            pdf_path, on_page=lambda i, total: print(f"Processing page {i+1}/{total}"))
         
-        print(f"Successfully extracted {len(text)} characters from PDF")
-        return text
+        print(f"Successfully extracted {result.char_count} characters "
+              f"({result.byte_count} bytes) from {result.page_count} pages "
+              f"in {result.elapsed:.2f}s")
+        return compact_text(result.pages)
     except Exception as e:
         print(f"Error extracting text: {e}")
         return None
@@ -30,22 +30,30 @@ def extract_text_from_pdf(pdf_path):
 def generate_summary(text, api_key):
     """Generate a summary using OpenAI API"""
     try:
+        # Imported here so usage errors are reported without loading the API client
+        import openai
         print("Connecting to OpenAI API...")
         openai.api_key = api_key
         
-        # Use just a portion of the text to stay within token limits
-        sample = text[:4000]
+        # Use as much of the text as fits in the model's context window
+        prompt = "Summarize this medical document:\n\n"
+        budget = prompt_budget(DEFAULT_MODEL, SYSTEM_PROMPT + prompt)
+        sample = split_tokens(text, budget, DEFAULT_MODEL)[0]
         
-        print("Sending request to OpenAI...")
+        print(f"Sending request to OpenAI (~{count_tokens(sample, DEFAULT_MODEL)} document tokens)...")
         response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+            model=DEFAULT_MODEL,
             messages=[
-                {"role": "system", "content": "You are a medical assistant summarizing patient encounters. Identify key information including: date, provider, reason for visit, assessment, plan, and medications."},
-                {"role": "user", "content": f"Summarize this medical document:\n\n{sample}"}
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt + sample}
             ]
         )
         
         summary = response.choices[0].message.content
+        usage = response.get("usage")
+        if usage:
+            print(f"Tokens used: {usage['prompt_tokens']} prompt + "
+                  f"{usage['completion_tokens']} completion")
         print("\nSummary generated successfully!")
         return summary
     except Exception as e:
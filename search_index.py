@@ -0,0 +1,207 @@
+"""
+Full-text inverted index over extracted page text.
+
+Each term maps to the documents (by content hash) and pages it occurs on,
+with the token positions on each page, so both keyword and quoted phrase
+queries are answered from the index without touching page text. Documents
+are added incrementally and persisted, one compressed posting blob per
+document, in a SQLite file next to the extraction cache. Only the documents
+open in the window are held in memory: a document indexed in an earlier
+session is read back from its blob when it is opened again, and dropped
+from memory when it is closed.
+"""
+import os
+import re
+import json
+import zlib
+import sqlite3
+import threading
+
+from cache import default_cache_dir
+
+_TOKEN = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def tokenize(text):
+    """Lowercased word tokens of text"""
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query):
+    """Split a query into phrases (lists of terms); quoted text is one phrase"""
+    phrases = []
+    for quoted, word in _QUERY.findall(query):
+        terms = tokenize(quoted or word)
+        if terms:
+            phrases.append(terms)
+    return phrases
+
+
+class SearchHit:
+    """A page matching a query"""
+    __slots__ = ("content_hash", "page", "score")
+
+    def __init__(self, content_hash, page, score):
+        self.content_hash = content_hash
+        self.page = page
+        self.score = score
+
+
+class SearchIndex:
+    """Incremental positional inverted index, optionally persisted to SQLite"""
+    def __init__(self, path=None):
+        self.path = path
+        # term -> {content hash -> {page -> [token positions]}}
+        self._postings = {}
+        self._terms = {}  # content hash -> its terms, to drop a document without a full scan
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def __contains__(self, content_hash):
+        with self._lock:
+            return content_hash in self._terms
+
+    def __len__(self):
+        """Number of documents held in memory"""
+        return len(self._terms)
+
+    def load_document(self, content_hash):
+        """Bring a document indexed in an earlier session into memory; False if it is not indexed"""
+        if content_hash in self:
+            return True
+        if self._conn is None:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM postings WHERE hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return False
+        self._merge(content_hash, json.loads(zlib.decompress(row[0])))
+        return True
+
+    def retain(self, content_hashes):
+        """Delete the persisted postings of every document not in content_hashes"""
+        if self._conn is None:
+            return
+        with self._lock, self._conn:
+            stale = [(content_hash,) for content_hash, in
+                     self._conn.execute("SELECT hash FROM postings")
+                     if content_hash not in content_hashes]
+            self._conn.executemany("DELETE FROM postings WHERE hash = ?", stale)
+
+    def add_document(self, content_hash, pages, replace=False, persist=True):
+        """Index the page texts of a document
+
+        A document that is already indexed is left alone unless replace is
+        set, e.g. after OCR filled in its scanned pages. Without persist the
+        postings are kept in memory only, and any saved ones are deleted, so
+        a later session indexes the document from its pages again.
+        """
+        if content_hash in self:
+            if not replace:
+                return
+            self.discard(content_hash)
+        # term -> {page: [positions]} for this document only
+        terms = {}
+        for number, text in enumerate(pages):
+            for position, term in enumerate(tokenize(text)):
+                terms.setdefault(term, {}).setdefault(number, []).append(position)
+        self._merge(content_hash, terms)
+        if self._conn is None:
+            return
+        if not persist:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM postings WHERE hash = ?", (content_hash,))
+            return
+        data = zlib.compress(json.dumps(terms, separators=(",", ":")).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO postings (hash, data) VALUES (?, ?)",
+                (content_hash, data))
+
+    def discard(self, content_hash):
+        """Drop a document from memory; its persisted postings are kept"""
+        with self._lock:
+            for term in self._terms.pop(content_hash, ()):
+                documents = self._postings[term]
+                del documents[content_hash]
+                if not documents:
+                    del self._postings[term]
+
+    def _merge(self, content_hash, terms):
+        with self._lock:
+            if content_hash in self._terms:
+                return
+            for term, pages in terms.items():
+                # JSON turns page numbers into strings
+                self._postings.setdefault(term, {})[content_hash] = {
+                    int(page): positions for page, positions in pages.items()}
+            self._terms[content_hash] = list(terms)
+
+    def _phrase_pages(self, terms):
+        """{(content hash, page): match count} for pages containing the phrase"""
+        postings = [self._postings.get(term) for term in terms]
+        if not all(postings):
+            return {}
+        # Walk the rarest term's documents first
+        first = min(postings, key=len)
+        matches = {}
+        for content_hash in first:
+            doc_postings = [p.get(content_hash) for p in postings]
+            if not all(doc_postings):
+                continue
+            for page in doc_postings[0]:
+                page_positions = [d.get(page) for d in doc_postings]
+                if not all(page_positions):
+                    continue
+                if len(terms) == 1:
+                    count = len(page_positions[0])
+                else:
+                    later = [set(positions) for positions in page_positions[1:]]
+                    count = sum(
+                        1 for start in page_positions[0]
+                        if all(start + i + 1 in positions for i, positions in enumerate(later)))
+                if count:
+                    matches[(content_hash, page)] = count
+        return matches
+
+    def search(self, query, limit=200):
+        """Pages matching every phrase of the query, best first"""
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        with self._lock:
+            results = None
+            for terms in phrases:
+                pages = self._phrase_pages(terms)
+                if results is None:
+                    results = pages
+                else:
+                    results = {key: results[key] + count
+                               for key, count in pages.items() if key in results}
+                if not results:
+                    return []
+        hits = [SearchHit(content_hash, page, score)
+                for (content_hash, page), score in results.items()]
+        hits.sort(key=lambda hit: (-hit.score, hit.content_hash, hit.page))
+        return hits[:limit]
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+
+def open_index():
+    """The persistent search index stored next to the extraction cache"""
+    try:
+        return SearchIndex(os.path.join(default_cache_dir(), "index.sqlite3"))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Search index cannot be persisted: {e}")
+        return SearchIndex()
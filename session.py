@@ -0,0 +1,194 @@
+"""
+Session files.
+
+A session stores the document list (paths, content hashes, page counts),
+the page text, summaries, structured fields and the encounter text, so a
+case can be reopened without extracting or summarizing anything again.
+
+The file is an indexed container:
+
+    MAGIC | page chunk | page chunk | ... | index | trailer
+
+Page text is stored in chunks of up to CHUNK_PAGES pages, each compressed
+on its own (zstd if the zstandard package is installed, zlib otherwise).
+The compressed JSON index at the end records every document with the
+offset and length of its chunks. The fixed-size trailer holds the index
+position and the codec. Opening a session reads only the trailer and the
+index; page chunks are read and decompressed when a page is first shown.
+"""
+import os
+import json
+import time
+import zlib
+import struct
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    import zstandard
+except ImportError:  # optional; sessions are written with zlib instead
+    zstandard = None
+
+MAGIC = b"POWSESS\x01"
+FORMAT_VERSION = 1
+CHUNK_PAGES = 16
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+# index offset, index length, codec, magic
+_TRAILER = struct.Struct("<QQ4s8s")
+
+
+def _compressor(codec):
+    if codec == b"zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    return lambda data: zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompressor(codec):
+    if codec == b"zstd":
+        if zstandard is None:
+            raise ValueError("this session is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress
+    if codec == b"zlib":
+        return zlib.decompress
+    raise ValueError(f"unknown session codec {codec!r}")
+
+
+def save_session(path, documents, encounter_text="", on_document=None):
+    """Write documents (MedicalDocuments) and the encounter text to a session file
+
+    on_document(done, total) reports progress. The file is written next to
+    path and renamed over it at the end, so a failed save leaves the
+    previous session intact. Returns the size of the file in bytes.
+    """
+    codec = b"zstd" if zstandard is not None else b"zlib"
+    compress = _compressor(codec)
+    documents = list(documents)
+    entries = []
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(MAGIC)
+            for done, document in enumerate(documents, start=1):
+                chunks = []  # [first page, offset, length]
+                for start in range(0, document.page_count, CHUNK_PAGES):
+                    stop = min(start + CHUNK_PAGES, document.page_count)
+                    pages = [document.page_text(number) for number in range(start, stop)]
+                    # Pages still waiting for OCR are stored as null, so reopening the
+                    # session reads them from the PDF and queues them for OCR again
+                    pages = [None if start + i in document.pending_ocr else text
+                             for i, text in enumerate(pages)]
+                    data = compress(json.dumps(pages).encode("utf-8"))
+                    chunks.append([start, file.tell(), len(data)])
+                    file.write(data)
+                entries.append({
+                    "path": document.path,
+                    "content_hash": document.content_hash,
+                    "page_count": document.page_count,
+                    "summary": document.summary,
+                    "fields": document.fields.to_dict() if document.fields else None,
+                    "chunks": chunks,
+                })
+                if on_document is not None:
+                    on_document(done, len(documents))
+
+            index = compress(json.dumps({
+                "version": FORMAT_VERSION,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "encounter_text": encounter_text,
+                "documents": entries,
+            }).encode("utf-8"))
+            index_offset = file.tell()
+            file.write(index)
+            file.write(_TRAILER.pack(index_offset, len(index), codec, MAGIC))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.path.getsize(path)
+
+
+class SessionReader:
+    """Open session file; the index is read up front and page chunks on demand"""
+    def __init__(self, path, max_chunks=32):
+        self.path = path
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()  # (document number, chunk number) -> page texts
+        self._lock = threading.Lock()
+        self._file = open(path, "rb")
+        try:
+            self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self):
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a P.O.W. Parser session file")
+        self._file.seek(-_TRAILER.size, os.SEEK_END)
+        index_offset, index_length, codec, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError("the session file is incomplete")
+        self._decompress = _decompressor(codec)
+        self._file.seek(index_offset)
+        index = json.loads(self._decompress(self._file.read(index_length)))
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported session version {index.get('version')}")
+        self.created = index.get("created")
+        self.encounter_text = index.get("encounter_text", "")
+        self.documents = index["documents"]
+        # Chunk start pages per document, for bisecting a page number to its chunk
+        self._starts = [[chunk[0] for chunk in entry["chunks"]] for entry in self.documents]
+
+    def page_text(self, document_number, page):
+        """Text of one page of the document_number-th document, or None if it is not stored"""
+        starts = self._starts[document_number]
+        chunk_number = bisect_right(starts, page) - 1
+        if chunk_number < 0:
+            return None
+        key = (document_number, chunk_number)
+        with self._lock:
+            pages = self._chunks.get(key)
+            if pages is None:
+                _, offset, length = self.documents[document_number]["chunks"][chunk_number]
+                self._file.seek(offset)
+                pages = json.loads(self._decompress(self._file.read(length)))
+                self._chunks[key] = pages
+                while len(self._chunks) > self.max_chunks:
+                    self._chunks.popitem(last=False)
+            else:
+                self._chunks.move_to_end(key)
+        index = page - starts[chunk_number]
+        return pages[index] if index < len(pages) else None
+
+    def close(self):
+        with self._lock:
+            self._chunks.clear()
+            self._file.close()
+
+
+class SessionSaver(QThread):
+    """Thread that writes a session file"""
+    progress = pyqtSignal(int, int)  # documents written, total
+    saved = pyqtSignal(str, int)     # path, size in bytes
+    failed = pyqtSignal(str, str)    # path, error message
+
+    def __init__(self, path, documents, encounter_text):
+        super().__init__()
+        self.path = path
+        self.documents = list(documents)
+        self.encounter_text = encounter_text
+
+    def run(self):
+        try:
+            size = save_session(self.path, self.documents, self.encounter_text,
+                                on_document=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(self.path, str(e))
+        else:
+            self.saved.emit(self.path, size)
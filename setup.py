@@ -52,6 +52,10 @@ def install_dependencies():
         subprocess.run([pip_path, "install", "openai==0.28.1"], check=True)
         print("OpenAI installed successfully.")
         
+        # Install aiohttp (async LLM client)
+        subprocess.run([pip_path, "install", "aiohttp==3.8.6"], check=True)
+        print("aiohttp installed successfully.")
+        
         # Show instructions for activating the virtual environment
         if platform.system() == "Windows":
             print("\nTo activate the virtual environment, run:")
@@ -3,13 +3,16 @@ import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QTextEdit, QListWidget, QFileDialog)
 from PyQt5.QtCore import Qt
-import fitz  # PyMuPDF
+
+from cache import file_hash, get_cache
+from extraction import extract_pdf
+from page_viewer import PagedDocumentView
 
 class SimplePOWParser(QMainWindow):
     """A simplified version of the P.O.W. Parser application"""
     def __init__(self):
         super().__init__()
-        self.documents = {}  # filename -> document text
+        self.documents = {}  # filename -> list of page texts
         self.initUI()
         
     def initUI(self):
@@ -43,8 +46,7 @@ class SimplePOWParser(QMainWindow):
         right_layout = QVBoxLayout()
         
         # Document view
-        self.doc_view = QTextEdit()
-        self.doc_view.setReadOnly(True)
+        self.doc_view = PagedDocumentView()
         
         # Encounter builder
         self.notes_edit = QTextEdit()
@@ -78,14 +80,21 @@ class SimplePOWParser(QMainWindow):
             filename = os.path.basename(file_path)
             
             try:
-                # Extract text from the PDF
-                doc = fitz.open(file_path)
-                text = ""
-                for page in doc:
-                    text += page.get_text()
+                # Reuse text extracted in an earlier session when the file is unchanged
+                cache = get_cache()
+                content_hash = file_hash(file_path)
+                pages = cache.get_pages(content_hash) if cache else None
+                
+                if pages is None:
+                    # Extract text from the PDF
+                    pages = extract_pdf(file_path).pages
+                    if cache:
+                        # Blank pages are stored too so get_pages finds the whole
+                        # document; the main window re-checks them for OCR
+                        cache.put_pages(content_hash, len(pages), pages)
                 
-                # Store document text
-                self.documents[filename] = text
+                # Store document pages
+                self.documents[filename] = pages
                 
                 # Add to list
                 self.doc_list.addItem(filename)
@@ -97,13 +106,9 @@ class SimplePOWParser(QMainWindow):
         """Display the selected document in the view area"""
         filename = item.text()
         if filename in self.documents:
-            # Display first 20,000 characters to avoid performance issues
-            text = self.documents[filename]
-            display_text = text[:20000]
-            if len(text) > 20000:
-                display_text += "\n\n[Document truncated due to length...]"
-            
-            self.doc_view.setText(display_text)
+            # The viewer renders only the pages around the visible one
+            pages = self.documents[filename]
+            self.doc_view.set_pages(len(pages), pages.__getitem__)
     
     def save_notes(self):
         """Save the notes/encounter text to a file"""
@@ -0,0 +1,162 @@
+"""
+Map-reduce summarization of long documents.
+
+The document is split into token-budgeted chunks, the chunks are summarized
+concurrently with a bounded number of requests in flight (map), and the
+partial summaries are merged into one final summary (reduce). If the partial
+summaries are themselves too long for one request they are merged in rounds.
+
+Chunks are measured in tokens (see tokens.py) and, unless a size is given,
+are as large as the model's context window allows next to the prompts.
+summarize_document compacts the page text before it is summarized.
+
+The engine only needs an async complete(messages) -> str coroutine
+function, so it can run against OpenAI, a local mock server or a stub.
+"""
+import asyncio
+import functools
+
+from cache import get_summary_cache, summary_key
+from llm import DEFAULT_MODEL, SYSTEM_PROMPT
+from tokens import compact_text, count_tokens, prompt_budget, split_tokens
+
+MAP_PROMPT = ("Summarize this excerpt (part {index} of {count}) of a medical document. "
+              "Keep every date, provider, reason for visit, assessment, plan and medication "
+              "it mentions:\n\n{text}")
+
+REDUCE_PROMPT = ("The following are summaries of consecutive parts of one medical document. "
+                 "Merge them into a single summary, removing repetition:\n\n{text}")
+
+SINGLE_PROMPT = "Summarize this medical document:\n\n{text}"
+
+
+def combine_partials(partials):
+    """Join partial summaries into one labelled text for the reduce step"""
+    return "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(partials))
+
+
+def chunk_text(text, max_tokens, model=DEFAULT_MODEL):
+    """Split text into chunks of at most max_tokens, breaking on line boundaries"""
+    chunks = []
+    current = []
+    length = 0
+    for line in text.splitlines(keepends=True):
+        tokens = count_tokens(line, model)
+        # A single line longer than the budget is split hard
+        if tokens > max_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, length = [], 0
+            *pieces, line = split_tokens(line, max_tokens, model)
+            chunks.extend(pieces)
+            tokens = count_tokens(line, model)
+        if length + tokens > max_tokens and current:
+            chunks.append("".join(current))
+            current, length = [], 0
+        current.append(line)
+        length += tokens
+    if current:
+        chunks.append("".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class ChunkedSummarizer:
+    """Summarizes documents of any length with concurrent map-reduce"""
+    def __init__(self, complete, max_workers=4, chunk_tokens=None, system_prompt=SYSTEM_PROMPT,
+                 model=DEFAULT_MODEL, memo=None):
+        self.complete = complete
+        self.max_workers = max_workers
+        # By default a chunk fills the context window left by the longest prompt
+        self.chunk_tokens = chunk_tokens or prompt_budget(
+            model, system_prompt + max(MAP_PROMPT, REDUCE_PROMPT, SINGLE_PROMPT, key=len))
+        self.system_prompt = system_prompt
+        self.model = model
+        self.memo = memo  # optional cache.SummaryCache
+
+    def cache_key(self, text):
+        """Memo key covering the text, prompts, model and chunking"""
+        return summary_key(text, model=self.model, system_prompt=self.system_prompt,
+                           prompts=[SINGLE_PROMPT, MAP_PROMPT, REDUCE_PROMPT],
+                           chunk_tokens=self.chunk_tokens)
+
+    async def summarize_memoized_async(self, text, on_token=None):
+        """Return (summary, from_cache), summarizing only on a memo miss
+
+        Memo lookups and writes run off the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        key = self.cache_key(text)
+        summary = await loop.run_in_executor(None, self.memo.get, key) if self.memo else None
+        if summary is not None:
+            return summary, True
+        summary = await self.summarize_async(text, on_token)
+        if self.memo and summary:
+            await loop.run_in_executor(None, self.memo.put, key, summary)
+        return summary, False
+
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+
+    async def summarize_async(self, text, on_token=None):
+        """Summarize text on the current event loop, splitting it into chunks when it exceeds the budget
+
+        If on_token is given, the final request (the one producing the
+        summary) is streamed through complete(messages, on_token=on_token).
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def ask(prompt, stream=False):
+            async with semaphore:
+                if stream and on_token:
+                    return await self.complete(self._messages(prompt), on_token=on_token)
+                return await self.complete(self._messages(prompt))
+
+        async def map_prompts(prompts):
+            return await asyncio.gather(*(ask(prompt) for prompt in prompts))
+
+        chunks = chunk_text(text, self.chunk_tokens, self.model)
+        if not chunks:
+            return ""
+        if len(chunks) == 1:
+            return await ask(SINGLE_PROMPT.format(text=chunks[0]), stream=True)
+
+        partials = await map_prompts([
+            MAP_PROMPT.format(index=i + 1, count=len(chunks), text=chunk)
+            for i, chunk in enumerate(chunks)
+        ])
+        while True:
+            combined = combine_partials(partials)
+            groups = chunk_text(combined, self.chunk_tokens, self.model)
+            # Stop when everything fits, or when another round would not shrink the input
+            if len(groups) <= 1 or len(groups) >= len(partials):
+                return await ask(REDUCE_PROMPT.format(text=combined), stream=True)
+            partials = await map_prompts([REDUCE_PROMPT.format(text=group) for group in groups])
+
+
+def document_prompt_text(document):
+    """Compacted text of a MedicalDocument, as sent to the LLM"""
+    return compact_text(document.page_text(n) for n in range(document.page_count))
+
+
+async def summarize_document(document, client, on_token=None, usage=None):
+    """Summarize a MedicalDocument with an AsyncLLMClient; returns (summary, from_cache)
+
+    If usage (an llm_client.TokenUsage) is given, the estimated and reported
+    tokens of every request are added to it. The summary is stored on the
+    document unless some of its pages are still queued for OCR.
+    """
+    loop = asyncio.get_running_loop()
+    # Page extraction and cache writes block, so they run off the event loop
+    text = await loop.run_in_executor(None, document_prompt_text, document)
+    if not text.strip():
+        raise ValueError("the document has no text yet (scanned pages may still be in the OCR queue)")
+    complete = client.complete if usage is None else functools.partial(client.complete, usage=usage)
+    summarizer = ChunkedSummarizer(complete, model=client.model, memo=get_summary_cache())
+    summary, from_cache = await summarizer.summarize_memoized_async(text, on_token)
+    # Left unsaved so Summarize All picks the document up again once OCR is done
+    if not document.pending_ocr:
+        await loop.run_in_executor(None, document.store_summary, summary)
+    return summary, from_cache
@@ -0,0 +1,109 @@
+"""
+Token counting and prompt budgeting.
+
+Tokens are counted with tiktoken when it is installed and estimated from the
+character count otherwise. Document text is compacted before it is sent to
+the LLM: whitespace is collapsed and lines that already appeared on an
+earlier page (letterheads, patient banners, repeated lab panels) are kept
+only once, so the context window is spent on content. Chunk sizes are
+derived from the model's context window instead of a fixed character cut.
+"""
+import re
+from functools import lru_cache
+
+# Used without tiktoken. English prose averages about 4 characters per token,
+# but records full of numbers, dates, codes and abbreviations come closer to 3,
+# and an estimate must not undercount or requests overflow the context window
+CHARS_PER_TOKEN = 3
+
+# Context window (prompt plus reply) by model name prefix; the longest match wins
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4o": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+REPLY_TOKENS = 1024     # tokens kept free for the reply
+BUDGET_MARGIN = 0.95    # share of the free context used when tokens are counted exactly
+ESTIMATE_MARGIN = 0.85  # share used when tokens are only estimated
+MESSAGE_TOKENS = 4      # per-message framing added by the chat format
+MIN_DUPLICATE_CHARS = 12  # shorter lines (values, headings) are never dropped as duplicates
+
+_SPACES = re.compile(r"[ \t\u00a0]+")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """tiktoken encoding for a model, or None to estimate"""
+    try:
+        # Imported on first use; loading it adds noticeably to startup
+        import tiktoken
+    except ImportError:  # optional; counts fall back to CHARS_PER_TOKEN
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # encoding files could not be loaded
+        print(f"Error loading tokenizer for {model}: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Number of tokens in text for model"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model="gpt-3.5-turbo"):
+    """Prompt tokens of a chat request"""
+    return sum(count_tokens(m["content"], model) + MESSAGE_TOKENS for m in messages) + 3
+
+
+def context_window(model):
+    """Context window of a model in tokens"""
+    matches = [prefix for prefix in CONTEXT_WINDOWS if model.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def prompt_budget(model, fixed_text="", reply_tokens=REPLY_TOKENS):
+    """Tokens of document text that fit in one request next to fixed_text (prompts)"""
+    used = count_tokens(fixed_text, model) + 2 * MESSAGE_TOKENS + 3
+    # Counting line by line is slightly off from counting the whole text, and
+    # estimates from the character count can be off by much more
+    margin = BUDGET_MARGIN if _encoding(model) is not None else ESTIMATE_MARGIN
+    return max(256, int((context_window(model) - reply_tokens - used) * margin))
+
+
+def split_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    """Split text into pieces of at most max_tokens"""
+    encoding = _encoding(model)
+    if encoding is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def compact_text(pages):
+    """Join page texts with whitespace collapsed and cross-page duplicate lines removed"""
+    seen = set()
+    lines = []
+    for text in pages:
+        page_lines = []
+        for line in text.splitlines():
+            line = _SPACES.sub(" ", line).strip()
+            if line and not (len(line) >= MIN_DUPLICATE_CHARS and line in seen):
+                page_lines.append(line)
+        # Lines repeated within a page are kept; only earlier pages count
+        seen.update(line for line in page_lines if len(line) >= MIN_DUPLICATE_CHARS)
+        lines.extend(page_lines)
+    return "\n".join(lines)
@@ -0,0 +1,111 @@
+"""
+Folder watch mode.
+
+FolderWatcher watches intake directories for new and modified PDFs. Change
+notifications from QFileSystemWatcher (inotify on Linux) are debounced, and
+a slow poll catches what notifications miss (network shares, in-place
+rewrites). A file is reported only once its size and modification time
+have stayed the same across two scans, so faxes that are still being
+written are not picked up half-finished. A burst of arrivals is reported
+as one list.
+
+Only stat() is used here; the content hash is computed during ingestion,
+so a file that was touched but not changed is recognized there.
+"""
+import os
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+
+class FolderWatcher(QObject):
+    """Reports new and modified PDFs in watched directories, in debounced batches"""
+    files_changed = pyqtSignal(list)  # paths of new or modified PDFs
+
+    DEBOUNCE_MS = 1000  # quiet time after a change before scanning (and between settle scans)
+    POLL_MS = 30000     # periodic rescan in case a notification was missed
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.directories = []
+        self._seen = {}      # path -> (mtime_ns, size) when last reported
+        self._settling = {}  # path -> (mtime_ns, size) at the last scan, not reported yet
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule_scan)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.scan)
+        self._poll = QTimer(self)
+        self._poll.setInterval(self.POLL_MS)
+        self._poll.timeout.connect(self.scan)
+
+    def add_directory(self, directory):
+        """Start watching a directory; the PDFs already in it are reported too"""
+        directory = os.path.abspath(directory)
+        if directory in self.directories:
+            return
+        self.directories.append(directory)
+        if not self._watcher.addPath(directory):
+            print(f"Error watching {directory}: change notifications unavailable, polling only")
+        self._poll.start()
+        self.scan()
+
+    def clear(self):
+        """Stop watching every directory"""
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        self.directories = []
+        self._seen.clear()
+        self._settling.clear()
+        self._debounce.stop()
+        self._poll.stop()
+
+    def _schedule_scan(self, _path=None):
+        # Restarting the timer coalesces a burst of notifications into one scan
+        self._debounce.start()
+
+    def _stat_pdfs(self, directory):
+        """{path: (mtime_ns, size)} of the PDFs directly inside directory"""
+        found = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(".pdf"):
+                        continue
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            found[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        continue  # removed while scanning
+        except OSError as e:
+            print(f"Error scanning {directory}: {e}")
+        return found
+
+    def scan(self):
+        """Compare the watched directories with the last scan and report settled changes"""
+        current = {}
+        for directory in self.directories:
+            current.update(self._stat_pdfs(directory))
+
+        ready = []
+        for path, signature in current.items():
+            if self._seen.get(path) == signature:
+                continue
+            if self._settling.get(path) == signature and signature[1] > 0:
+                ready.append(path)
+                self._seen[path] = signature
+                del self._settling[path]
+            else:
+                self._settling[path] = signature
+
+        # Forget deleted files so a file restored under the same name is new again
+        for known in (self._seen, self._settling):
+            for path in [path for path in known if path not in current]:
+                del known[path]
+
+        if self._settling:
+            self._debounce.start()
+        if ready:
+            self.files_changed.emit(sorted(ready))